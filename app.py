@@ -6,22 +6,113 @@ from flask import Flask, jsonify
 from flask_smorest import Api
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 from db import db
-from blocklist import BLOCKLIST
+from blocklist import BlocklistUnavailable, make_blocklist
+from ratelimit import RateLimits, make_rate_limiter
+from search import make_search_backend
+from cache import ResponseCache
+from category_index import CategoryIndex
+from idempotency import IdempotencyKeys
+from passwords import HasherBusy, PasswordHasher
+from principals import PrincipalCache
+from metrics import engine_options, init_metrics, instrument_redis
+from profiler import SQLProfiler
+from replicas import ReplicaRouter, replica_binds
+import counters  # noqa: F401 keeps the counter columns in step with writes
+from json_provider import OrjsonProvider
+from commands import register_commands
 
 from resources.user import blp as UserBlueprint
 from resources.post import blp as PostBlueprint
 from resources.category import blp as CategoryBlueprint
 from resources.comment import blp as CommentBlueprint
+from resources.cache import blp as CacheBlueprint
+from resources.imports import blp as ImportBlueprint
+from resources.exports import blp as ExportBlueprint
+from resources.job import blp as JobBlueprint
 
 
-def create_app(db_url=None):
+def create_app(db_url=None, replica_urls=None):
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     load_dotenv()
 
-    connection = redis.from_url(os.getenv("REDIS_URL"))
+    connection = instrument_redis(redis.from_url(os.getenv("REDIS_URL")))
     app.queue = Queue("emails", connection=connection)
+    # long-running jobs such as large deletions, kept apart from the emails
+    app.maintenance_queue = Queue("maintenance", connection=connection)
+
+    # read replicas for the read-only routes (comma separated URLs); a user
+    # reads from the primary for this many seconds after writing
+    if replica_urls is None:
+        replica_urls = os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+    replica_urls = [url.strip() for url in replica_urls if url.strip()]
+    read_your_writes = int(os.getenv("READ_YOUR_WRITES_SECONDS", 10))
+
+    # response cache TTLs in seconds per route, 0 disables caching the route
+    app.config["CACHE_TTLS"] = {
+        "post_detail": int(os.getenv("CACHE_TTL_POST_DETAIL", 60)),
+        "post_list": int(os.getenv("CACHE_TTL_POST_LIST", 30)),
+        "category_list": int(os.getenv("CACHE_TTL_CATEGORY_LIST", 300)),
+        "category_detail": int(os.getenv("CACHE_TTL_CATEGORY_DETAIL", 300)),
+    }
+    app.cache = ResponseCache(
+        connection,
+        app.config["CACHE_TTLS"],
+        fence_seconds=read_your_writes if replica_urls else 0,
+    )
+    app.category_index = CategoryIndex(connection)
+    # responses of writes sent with an Idempotency-Key, replayed to retries.
+    # the lock must outlast the slowest of those views (registration waits up
+    # to PASSWORD_HASH_TIMEOUT for a hash), or a retry runs the view again
+    app.idempotency = IdempotencyKeys(
+        connection,
+        ttl=int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", 86400)),
+        lock_seconds=int(
+            os.getenv(
+                "IDEMPOTENCY_LOCK_SECONDS",
+                max(60, 3 * int(os.getenv("PASSWORD_HASH_TIMEOUT", 10))),
+            )
+        ),
+    )
+    # user snapshots behind role checks, dropped whenever a user changes
+    app.principals = PrincipalCache(
+        connection, ttl=int(os.getenv("PRINCIPAL_CACHE_SECONDS", 60))
+    )
+
+    # "redis" shares logouts between workers, "memory" is per process (tests)
+    app.blocklist = make_blocklist(
+        os.getenv("BLOCKLIST_BACKEND", "redis"),
+        connection,
+        negative_ttl=int(os.getenv("BLOCKLIST_NEGATIVE_CACHE_SECONDS", 5)),
+    )
+
+    # werkzeug method string; existing hashes are upgraded at the next login
+    app.config["PASSWORD_HASH_METHOD"] = os.getenv(
+        "PASSWORD_HASH_METHOD", "pbkdf2:sha256"
+    )
+    app.password_hasher = PasswordHasher(
+        app.config["PASSWORD_HASH_METHOD"],
+        workers=int(os.getenv("PASSWORD_HASH_WORKERS", 2)),
+        # per web worker; keep it below GUNICORN_THREADS so other requests
+        # always have a thread left
+        max_pending=int(
+            os.getenv(
+                "PASSWORD_HASH_MAX_PENDING",
+                max(int(os.getenv("GUNICORN_THREADS", 8)) // 2, 1),
+            )
+        ),
+        timeout=int(os.getenv("PASSWORD_HASH_TIMEOUT", 10)),
+    )
+
+    # deletions cascading to more rows than this run as a background job,
+    # a chunk of rows per transaction
+    app.config["DELETE_IN_BACKGROUND_ABOVE"] = int(
+        os.getenv("DELETE_IN_BACKGROUND_ABOVE", 1000)
+    )
+    app.config["DELETE_CHUNK_SIZE"] = int(os.getenv("DELETE_CHUNK_SIZE", 1000))
 
     app.config["PROPAGATE_EXCEPTIONS"] = True
     app.config["API_TITLE"] = "Blog CMS API"
@@ -36,7 +127,55 @@ def create_app(db_url=None):
         "DATABASE_URL", "sqlite:///data.db"
     )
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+        app.config["SQLALCHEMY_DATABASE_URI"]
+    )
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(replica_urls, engine_options)
+    app.search = make_search_backend(app.config["SQLALCHEMY_DATABASE_URI"])
     db.init_app(app)
+    app.replicas = ReplicaRouter(
+        connection,
+        app.config["SQLALCHEMY_BINDS"],
+        pin_seconds=read_your_writes,
+        retry_seconds=int(os.getenv("REPLICA_RETRY_SECONDS", 30)),
+    )
+    app.replicas.init_app(app)
+    init_metrics(app, queues=[app.queue, app.maintenance_queue])
+
+    # request budgets per route ("10/minute per ip, 100/hour per user"): the
+    # most specific of endpoint?query-argument, endpoint, blueprint and
+    # default applies. "redis" shares them between workers, "memory" is per
+    # process (tests), "off" disables them. registered after the metrics
+    # hooks so rejected requests are counted too
+    app.config["RATE_LIMITS"] = {
+        "default": os.getenv(
+            "RATE_LIMIT_DEFAULT", "1200/minute per ip, 600/minute per user"
+        ),
+        "Users.UserLogin": os.getenv("RATE_LIMIT_LOGIN", "10/minute per ip"),
+        "Users.UserRegister": os.getenv("RATE_LIMIT_REGISTER", "10/hour per ip"),
+        "Post.PostList?q": os.getenv(
+            "RATE_LIMIT_SEARCH", "30/minute per user, 120/minute per ip"
+        ),
+        "metrics": "",
+    }
+    # per-ip budgets need the client's address: behind a load balancer or
+    # reverse proxy, trust this many X-Forwarded-For entries. never more than
+    # there are proxies, or clients can choose their own address
+    trusted_proxies = int(os.getenv("TRUSTED_PROXY_COUNT", 0))
+    if trusted_proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies)
+    RateLimits(
+        make_rate_limiter(os.getenv("RATE_LIMIT_BACKEND", "redis"), connection),
+        app.config["RATE_LIMITS"],
+    ).init_app(app)
+
+    # opt-in: per-request query counts, slow query log and N+1 warnings
+    if os.getenv("SQL_PROFILING", "0") == "1":
+        SQLProfiler(
+            slow_query_ms=float(os.getenv("SQL_SLOW_QUERY_MS", 100)),
+            n_plus_one_threshold=int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5)),
+            explain_analyze=os.getenv("SQL_EXPLAIN_ANALYZE", "1") == "1",
+        ).init_app(app)
     migrate = Migrate(app, db)
     api = Api(app)
 
@@ -47,7 +186,7 @@ def create_app(db_url=None):
 
     @jwt.token_in_blocklist_loader
     def check_if_token_in_blocklist(jwt_header, jwt_payload):
-        return jwt_payload["jti"] in BLOCKLIST
+        return app.blocklist.is_revoked(jwt_payload["jti"], jwt_payload["exp"])
 
     @jwt.revoked_token_loader
     def revoked_token_callback(jwt_header, jwt_payload):
@@ -65,8 +204,40 @@ def create_app(db_url=None):
             401,
         )
 
+    @app.errorhandler(HasherBusy)
+    def hasher_busy_callback(error):
+        return (
+            jsonify(
+                {
+                    "message": "Too many password checks in progress, try again shortly.",
+                    "error": "hasher_busy",
+                }
+            ),
+            503,
+            {"Retry-After": "1"},
+        )
+
+    @app.errorhandler(BlocklistUnavailable)
+    def blocklist_unavailable_callback(error):
+        return (
+            jsonify(
+                {
+                    "message": "Could not log out right now, try again shortly.",
+                    "error": "logout_unavailable",
+                }
+            ),
+            503,
+            {"Retry-After": "1"},
+        )
+
     api.register_blueprint(UserBlueprint)
     api.register_blueprint(PostBlueprint)
     api.register_blueprint(CategoryBlueprint)
     api.register_blueprint(CommentBlueprint)
+    api.register_blueprint(CacheBlueprint)
+    api.register_blueprint(ImportBlueprint)
+    api.register_blueprint(ExportBlueprint)
+    api.register_blueprint(JobBlueprint)
+
+    register_commands(app)
     return app
@@ -0,0 +1,65 @@
+"""Compare two benchmark runs and fail on regressions.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 0.10
+
+A route regresses when the chosen percentile grew by more than
+``--threshold`` (a fraction) and by more than ``--min-delta-ms``, so noise
+on sub-millisecond routes doesn't fail the comparison. Exits with status 1
+if any route regressed.
+"""
+
+import argparse
+import json
+import sys
+
+
+def _load(path):
+    with open(path) as source:
+        report = json.load(source)
+    return {
+        (result["backend"], result["scale"], result["route"]): result
+        for result in report["results"]
+    }
+
+
+def compare(baseline, current, metric="p95_ms", threshold=0.10, min_delta_ms=1.0):
+    """Return (rows, regressed) for the routes present in both runs."""
+    rows, regressed = [], False
+    for key in sorted(baseline.keys() & current.keys(), key=str):
+        before, after = baseline[key][metric], current[key][metric]
+        change = (after - before) / before if before else 0.0
+        is_regression = change > threshold and after - before > min_delta_ms
+        regressed = regressed or is_regression
+        rows.append((key, before, after, change, is_regression))
+    return rows, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument(
+        "--metric", default="p95_ms", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"]
+    )
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--min-delta-ms", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    baseline, current = _load(args.baseline), _load(args.current)
+    rows, regressed = compare(
+        baseline, current, args.metric, args.threshold, args.min_delta_ms
+    )
+    for (backend, scale, route), before, after, change, is_regression in rows:
+        flag = "REGRESSION" if is_regression else ""
+        print(
+            f"{backend:10} {scale:>8} {route:28} {before:9.2f} -> {after:9.2f} ms"
+            f" {change:+7.1%} {flag}"
+        )
+    for key in sorted(baseline.keys() - current.keys(), key=str):
+        print(f"missing from current run: {' '.join(map(str, key))}")
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Time the hot API routes against seeded databases.
+
+    python -m benchmarks.run --scale 10000 --scale 100000 -o results.json
+    python -m benchmarks.run --postgres-url postgresql://... -o results.json
+
+Each scale gets its own database, seeded once with ``seeding.seed`` and
+reused by later runs. The Postgres database is wiped before seeding, so
+point ``--postgres-url`` at a database used only for benchmarks. Redis is
+taken from ``REDIS_URL`` as in the app. Response caching is off unless
+``--with-cache`` is given, so the numbers measure the database path.
+Before timing, the hot queries are checked as by ``flask check-query-plans``
+and a sequential scan stops the run with a non-zero status.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_SCALES = [10000]
+DEFAULT_REQUESTS = 200
+LOGIN_REQUESTS = 20
+WARMUP_REQUESTS = 5
+
+
+def _configure_env(with_cache):
+    # before create_app reads them
+    if not with_cache:
+        for route in ("POST_DETAIL", "POST_LIST", "CATEGORY_LIST", "CATEGORY_DETAIL"):
+            os.environ[f"CACHE_TTL_{route}"] = "0"
+    # hash in the request thread, like the pre-pool code path, and don't
+    # let profiling distort the timings
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+    os.environ["SQL_PROFILING"] = "0"
+    # the suite sends far more requests per client than any budget allows
+    os.environ["RATE_LIMIT_BACKEND"] = "off"
+
+
+def _prepare_database(app, scale, seed):
+    from flask_migrate import upgrade
+    from sqlalchemy import text
+
+    from db import db
+    from models import PostModel
+    from seeding import seed as seed_database
+
+    with app.app_context():
+        try:
+            seeded = db.session.scalar(db.select(db.func.count(PostModel.id)))
+            # data seeded before a model change can't be reused
+            for table in db.metadata.sorted_tables:
+                db.session.execute(db.select(*table.c).limit(1))
+        except Exception:
+            db.session.rollback()
+            seeded = None
+        if seeded == scale:
+            return
+
+        print(f"  seeding {scale} posts ...", flush=True)
+        db.drop_all()
+        db.session.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        db.session.execute(text("DROP TABLE IF EXISTS posts_fts"))
+        db.session.commit()
+        if db.engine.dialect.name == "postgresql":
+            # the search column only exists through its migration
+            upgrade(directory=os.path.join(ROOT, "migrations"))
+        else:
+            # the migrations were written for Postgres; the search backend
+            # creates the FTS table itself
+            db.create_all()
+        started = time.perf_counter()
+        seed_database(scale, seed=seed)
+        print(f"  seeded in {time.perf_counter() - started:.1f}s", flush=True)
+
+
+def _check_query_plans(app):
+    # timings of a query that lost its index would be meaningless; the
+    # same check as flask check-query-plans
+    from commands.query_plans import seq_scans
+
+    with app.app_context():
+        failed = {name: tables for name, tables in seq_scans().items() if tables}
+    for name, tables in failed.items():
+        print(f"  sequential scan on {', '.join(tables)}: {name}", flush=True)
+    if failed:
+        raise SystemExit("query plan check failed")
+
+
+def _samples(app, count, seed):
+    """Ids the routes are called with, picked at random from the data."""
+    from flask_jwt_extended import create_access_token
+
+    from db import db
+    from enums.roles import UserRole
+    from models import CategoryModel, PostModel, UserModel
+    from seeding import SEED_PASSWORD
+
+    rng = random.Random(seed)
+    with app.app_context():
+        post_ids = db.session.scalars(
+            db.select(PostModel.id).order_by(db.func.random()).limit(count)
+        ).all()
+        author_ids = db.session.scalars(
+            db.select(PostModel.author_id).order_by(db.func.random()).limit(count)
+        ).all()
+        categories = db.session.scalars(db.select(CategoryModel.name)).all()
+        admin = db.session.scalars(
+            db.select(UserModel).where(UserModel.role == UserRole.ADMIN.value)
+        ).first()
+        login = (
+            db.session.scalars(
+                db.select(UserModel.username).where(
+                    UserModel.role != UserRole.ADMIN.value
+                )
+            ).first()
+            or admin.username
+        )
+        token = create_access_token(
+            identity=admin.id, additional_claims={"role": admin.role}, fresh=True
+        )
+    return {
+        "rng": rng,
+        "post_ids": post_ids,
+        "author_ids": author_ids,
+        "categories": categories,
+        "login": {"username_email": login, "password": SEED_PASSWORD},
+        "headers": {"Authorization": f"Bearer {token}"},
+        "own_post_ids": [],
+    }
+
+
+def _routes(samples):
+    """name -> (request count, callable(client) returning a response)."""
+    rng = samples["rng"]
+    headers = samples["headers"]
+    words = ["flask", "python query", "redis cache", "postgres index"]
+
+    def create_post(client):
+        response = client.post(
+            "/posts",
+            json={
+                "title": "benchmark post",
+                "content": "created while benchmarking the api",
+                "category_names": rng.sample(samples["categories"], 2),
+            },
+            headers=headers,
+        )
+        samples["own_post_ids"].append(response.get_json()["id"])
+        return response
+
+    return {
+        "GET /posts": (None, lambda c: c.get("/posts", headers=headers)),
+        "GET /posts?fields=&excerpt=": (
+            None,
+            lambda c: c.get(
+                "/posts",
+                query_string={"fields": "id,title,author", "excerpt": 200},
+                headers=headers,
+            ),
+        ),
+        "GET /posts?category=": (
+            None,
+            lambda c: c.get(
+                "/posts",
+                query_string={"category": rng.choice(samples["categories"])},
+                headers=headers,
+            ),
+        ),
+        "GET /posts?author_id=": (
+            None,
+            lambda c: c.get(
+                "/posts",
+                query_string={"author_id": rng.choice(samples["author_ids"])},
+                headers=headers,
+            ),
+        ),
+        "GET /posts?q=": (
+            None,
+            lambda c: c.get(
+                "/posts", query_string={"q": rng.choice(words)}, headers=headers
+            ),
+        ),
+        "GET /posts/<id>": (
+            None,
+            lambda c: c.get(
+                f"/posts/{rng.choice(samples['post_ids'])}", headers=headers
+            ),
+        ),
+        "GET /posts/<id>/comments": (
+            None,
+            lambda c: c.get(
+                f"/posts/{rng.choice(samples['post_ids'])}/comments", headers=headers
+            ),
+        ),
+        "GET /categories": (None, lambda c: c.get("/categories", headers=headers)),
+        "POST /login": (
+            LOGIN_REQUESTS,
+            lambda c: c.post("/login", json=samples["login"]),
+        ),
+        "POST /posts": (None, create_post),
+        # updates the posts created by the previous route
+        "PUT /posts/<id>": (
+            None,
+            lambda c: c.put(
+                f"/posts/{rng.choice(samples['own_post_ids'])}",
+                json={"title": "updated", "content": "updated while benchmarking"},
+                headers=headers,
+            ),
+        ),
+    }
+
+
+def _percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _time_route(client, call, count):
+    for _ in range(min(WARMUP_REQUESTS, count)):
+        call(client)
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = call(client)
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f"{response.status_code}: {response.get_data(as_text=True)}"
+            )
+    timings.sort()
+    return {
+        "requests": count,
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": _percentile(timings, 0.50),
+        "p95_ms": _percentile(timings, 0.95),
+        "p99_ms": _percentile(timings, 0.99),
+        "max_ms": timings[-1],
+    }
+
+
+def run_backend(backend, url_for_scale, scales, requests, seed):
+    from app import create_app
+
+    results = []
+    for scale in scales:
+        print(f"{backend} @ {scale} posts", flush=True)
+        app = create_app(db_url=url_for_scale(scale))
+        _prepare_database(app, scale, seed)
+        _check_query_plans(app)
+        samples = _samples(app, 500, seed)
+        client = app.test_client()
+        for route, (count, call) in _routes(samples).items():
+            stats = _time_route(client, call, count or requests)
+            print(
+                f"  {route:28} p50 {stats['p50_ms']:8.2f}  p95 {stats['p95_ms']:8.2f}"
+                f"  p99 {stats['p99_ms']:8.2f} ms",
+                flush=True,
+            )
+            results.append(
+                {"backend": backend, "scale": scale, "route": route, **stats}
+            )
+        # leave the data as seeded, so the next run can reuse it
+        for post_id in samples["own_post_ids"]:
+            client.delete(f"/posts/{post_id}", headers=samples["headers"])
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, action="append", help="posts to seed")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, ".benchmarks"))
+    parser.add_argument("--postgres-url", default=os.getenv("BENCHMARK_POSTGRES_URL"))
+    parser.add_argument("--skip-sqlite", action="store_true")
+    parser.add_argument("--with-cache", action="store_true")
+    parser.add_argument("-o", "--output", default="benchmark-results.json")
+    args = parser.parse_args(argv)
+
+    _configure_env(args.with_cache)
+    scales = args.scale or DEFAULT_SCALES
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    results = []
+    if not args.skip_sqlite:
+        results += run_backend(
+            "sqlite",
+            lambda scale: f"sqlite:///{os.path.join(args.data_dir, f'posts-{scale}.db')}",
+            scales,
+            args.requests,
+            args.seed,
+        )
+    if args.postgres_url:
+        results += run_backend(
+            "postgresql",
+            lambda scale: args.postgres_url,
+            scales,
+            args.requests,
+            args.seed,
+        )
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "with_cache": args.with_cache,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
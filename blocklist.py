@@ -1,2 +1,114 @@
-# the list of logged out users' access tokens
-BLOCKLIST = set()
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class BlocklistUnavailable(Exception):
+    """A token could not be revoked; the logout should be retried later."""
+
+
+# logged out tokens, kept until they would have expired anyway
+class InMemoryBlocklist:
+    """Per-process blocklist, for tests and single-worker development."""
+
+    def __init__(self):
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, expires_at):
+        now = time.time()
+        with self._lock:
+            self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti, expires_at):
+        with self._lock:
+            revoked_until = self._revoked.get(jti)
+            if revoked_until is not None and revoked_until <= time.time():
+                del self._revoked[jti]
+                return False
+            return revoked_until is not None
+
+
+class RedisBlocklist:
+    """Blocklist shared by all workers through Redis.
+
+    Each revoked jti is a key that expires together with the token. Answers
+    are kept in-process so most requests skip the round trip: revocations
+    until the token expires, and "not revoked" for ``negative_ttl`` seconds,
+    which bounds how long another worker can still accept a logged out token.
+    Each cache holds at most ``max_cached`` tokens, dropping the oldest first.
+    """
+
+    KEY_PREFIX = "blocklist:"
+
+    def __init__(self, connection, negative_ttl=5, max_cached=10000):
+        self.connection = connection
+        self.negative_ttl = negative_ttl
+        self.max_cached = max_cached
+        self._revoked = OrderedDict()
+        self._not_revoked = OrderedDict()
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, expires_at):
+        now = time.time()
+        ttl = max(int(expires_at - now), 1)
+        try:
+            self.connection.set(f"{self.KEY_PREFIX}{jti}", 1, ex=ttl)
+        except redis.RedisError as error:
+            # unlike a lookup this can't fail open: the token would stay valid
+            logger.exception("Token revocation failed.")
+            raise BlocklistUnavailable() from error
+        with self._lock:
+            self._cache_revoked(jti, expires_at, now)
+            self._not_revoked.pop(jti, None)
+
+    def _cache_revoked(self, jti, expires_at, now):
+        # an evicted token is still revoked in Redis, it just costs a lookup
+        if len(self._revoked) >= self.max_cached:
+            for key in [k for k, v in self._revoked.items() if v <= now]:
+                del self._revoked[key]
+        self._revoked[jti] = expires_at
+        self._revoked.move_to_end(jti)
+        while len(self._revoked) > self.max_cached:
+            self._revoked.popitem(last=False)
+
+    def is_revoked(self, jti, expires_at):
+        now = time.time()
+        with self._lock:
+            if jti in self._revoked:
+                return True
+            checked_until = self._not_revoked.get(jti)
+            if checked_until is not None and checked_until > now:
+                return False
+
+        try:
+            revoked = bool(self.connection.exists(f"{self.KEY_PREFIX}{jti}"))
+        except redis.RedisError:
+            # fail open: tokens are short-lived and an outage must not log
+            # every user out
+            logger.exception("Token blocklist lookup failed.")
+            return False
+
+        with self._lock:
+            if revoked:
+                self._cache_revoked(jti, expires_at, now)
+            elif self.negative_ttl:
+                self._not_revoked[jti] = now + self.negative_ttl
+                self._not_revoked.move_to_end(jti)
+                while len(self._not_revoked) > self.max_cached:
+                    self._not_revoked.popitem(last=False)
+        return revoked
+
+
+def make_blocklist(backend, connection, negative_ttl):
+    if backend == "redis":
+        return RedisBlocklist(connection, negative_ttl=negative_ttl)
+    if backend == "memory":
+        return InMemoryBlocklist()
+    raise RuntimeError(f"Unknown token blocklist backend: {backend}.")
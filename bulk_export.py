@@ -0,0 +1,157 @@
+import csv
+import io
+
+from flask import current_app
+
+from db import db
+from models import CategoryModel, CommentModel, PostCategoryModel, PostModel, UserModel
+from resources.post import filter_posts
+
+BATCH_SIZE = 1000
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# joins category_names in a single CSV cell
+CSV_LIST_SEPARATOR = ";"
+
+
+def _created_between(query, column, args):
+    # ?created_after=2023-01-01&created_before=2023-12-31, as on the post list
+    if args.get("created_after"):
+        query = query.filter(column > args.get("created_after"))
+    if args.get("created_before"):
+        query = query.filter(column < args.get("created_before"))
+    return query
+
+
+def _post_query(args):
+    query = filter_posts(
+        db.select(
+            PostModel.id,
+            PostModel.author_id,
+            PostModel.title,
+            PostModel.content,
+            PostModel.created_at,
+        ),
+        args,
+    )
+    search = args.get("q", "").strip()
+    if search:
+        query, _, _ = current_app.search.search(query, search)
+    return query.order_by(PostModel.created_at, PostModel.id)
+
+
+def _comment_query(args):
+    query = db.select(
+        CommentModel.id,
+        CommentModel.post_id,
+        CommentModel.user_id,
+        CommentModel.content,
+        CommentModel.created_at,
+    )
+    if args.get("post_id"):
+        query = query.filter(CommentModel.post_id == args.get("post_id"))
+    if args.get("user_id"):
+        query = query.filter(CommentModel.user_id == args.get("user_id"))
+    query = _created_between(query, CommentModel.created_at, args)
+    return query.order_by(CommentModel.created_at, CommentModel.id)
+
+
+def _user_query(args):
+    query = db.select(
+        UserModel.id,
+        UserModel.username,
+        UserModel.email,
+        UserModel.role,
+        UserModel.created_at,
+    )
+    query = _created_between(query, UserModel.created_at, args)
+    return query.order_by(UserModel.id)
+
+
+def _add_category_names(rows):
+    # one query per batch instead of loading the relationship per post
+    names = {row["id"]: [] for row in rows}
+    links = db.session.execute(
+        db.select(PostCategoryModel.post_id, CategoryModel.name)
+        .join(CategoryModel, PostCategoryModel.category_id == CategoryModel.id)
+        .where(PostCategoryModel.post_id.in_(list(names)))
+        .order_by(CategoryModel.name)
+    )
+    for post_id, name in links:
+        names[post_id].append(name)
+    for row in rows:
+        row["category_names"] = names[row["id"]]
+
+
+# kind -> (query builder, columns, per-batch hook)
+EXPORTS = {
+    "posts": (
+        _post_query,
+        ["id", "author_id", "title", "content", "category_names", "created_at"],
+        _add_category_names,
+    ),
+    "comments": (
+        _comment_query,
+        ["id", "post_id", "user_id", "content", "created_at"],
+        None,
+    ),
+    "users": (_user_query, ["id", "username", "email", "role", "created_at"], None),
+}
+# the NDJSON "type" of each kind, matching the import format
+RECORD_TYPES = {"posts": "post", "comments": "comment", "users": "user"}
+
+
+def _batches(kind, args, batch_size):
+    build_query, _, add_fields = EXPORTS[kind]
+    # plain rows, not models: nothing accumulates in the session, and
+    # yield_per makes the driver stream (a server-side cursor on Postgres)
+    result = db.session.execute(
+        build_query(args).execution_options(yield_per=batch_size)
+    )
+    for partition in result.mappings().partitions():
+        rows = [dict(row) for row in partition]
+        for row in rows:
+            row["created_at"] = row["created_at"].isoformat()
+        if add_fields:
+            add_fields(rows)
+        yield rows
+
+
+def _ndjson(kind, batches):
+    record_type = RECORD_TYPES[kind]
+    for rows in batches:
+        # one chunk per batch rather than one write per row
+        yield "".join(
+            current_app.json.dumps({"type": record_type, **row}) + "\n" for row in rows
+        )
+
+
+def _csv(kind, batches):
+    columns = EXPORTS[kind][1]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    for rows in batches:
+        for row in rows:
+            if "category_names" in row:
+                row["category_names"] = CSV_LIST_SEPARATOR.join(row["category_names"])
+            writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # an empty export still yields its header
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+
+def export_rows(kind, args, fmt="ndjson", batch_size=BATCH_SIZE):
+    """Yield ``kind`` ("posts", "comments" or "users") as NDJSON or CSV text.
+
+    Rows are read ``batch_size`` at a time and serialized as they arrive,
+    so memory use does not depend on the size of the table. Posts accept the
+    filters of ``GET /posts``; NDJSON posts and comments are in the format
+    ``POST /import`` reads.
+    """
+    batches = _batches(kind, args, batch_size)
+    if fmt == "csv":
+        return _csv(kind, batches)
+    return _ndjson(kind, batches)
@@ -0,0 +1,261 @@
+import json
+from datetime import timezone
+from itertools import groupby
+
+from flask import current_app
+from marshmallow import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+import counters
+from cache import CATEGORY_COUNTS_TAG, comment_write_tags
+from db import db
+from models import CategoryModel, CommentModel, PostCategoryModel, PostModel, UserModel
+from schemas import CategoryImportSchema, CommentImportSchema, PostImportSchema
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 10000
+# the report is capped so memory stays flat however bad the input is
+MAX_REPORTED_ERRORS = 1000
+
+SCHEMAS = {
+    "category": CategoryImportSchema(),
+    "post": PostImportSchema(),
+    "comment": CommentImportSchema(),
+}
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = {"categories": 0, "posts": 0, "comments": 0}
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _parse(raw):
+    """Validate one NDJSON line, returning (type, row dict)."""
+    try:
+        record = json.loads(raw)
+    except ValueError:
+        raise ValidationError("Line is not valid JSON.")
+    if not isinstance(record, dict):
+        raise ValidationError("Line must be a JSON object.")
+
+    kind = record.pop("type", None)
+    if kind not in SCHEMAS:
+        raise ValidationError({"type": [f"Must be one of: {', '.join(SCHEMAS)}."]})
+
+    row = SCHEMAS[kind].load(record)
+    for key, value in row.items():
+        if key == "id" or key.endswith("_id"):
+            row[key] = str(value)
+    if row.get("created_at"):
+        created_at = row["created_at"]
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        # an imported post or comment has not been edited since
+        row["created_at"] = row["updated_at"] = created_at
+    return kind, row
+
+
+def _existing(column, values):
+    if not values:
+        return set()
+    return set(db.session.scalars(db.select(column).where(column.in_(list(values)))))
+
+
+def _insert(model, rows):
+    # executemany needs the same keys in every row (created_at is optional)
+    rows = sorted(rows, key=lambda row: sorted(row))
+    for _, group in groupby(rows, key=lambda row: sorted(row)):
+        db.session.execute(insert(model), list(group))
+
+
+def _split(chunk, kind):
+    return [(line, row) for line, row_kind, row in chunk if row_kind == kind]
+
+
+def _keep_new(entries, column, reject, label):
+    """Drop rows whose id already exists, in the table or earlier in the chunk."""
+    taken = _existing(column, [row["id"] for _, row in entries])
+    kept = []
+    for line, row in entries:
+        if row["id"] in taken:
+            reject(line, {"id": [f"A {label} with this id already exists."]})
+            continue
+        taken.add(row["id"])
+        kept.append((line, row))
+    return kept
+
+
+def _stage_chunk(chunk, reject):
+    """Insert the valid rows of one chunk, without committing.
+
+    Invalid lines are passed to ``reject``. Returns the new categories,
+    posts and comments as (line, row) pairs, the post/category links and
+    the ids of the categories the posts named.
+    """
+    categories = _keep_new(
+        _split(chunk, "category"), CategoryModel.id, reject, "category"
+    )
+    taken_names = _existing(CategoryModel.name, [row["name"] for _, row in categories])
+    new_categories = []
+    for line, row in categories:
+        if row["name"] in taken_names:
+            reject(line, {"name": ["A category with this name already exists."]})
+            continue
+        taken_names.add(row["name"])
+        new_categories.append((line, row))
+    if new_categories:
+        _insert(CategoryModel, [row for _, row in new_categories])
+
+    posts = _keep_new(_split(chunk, "post"), PostModel.id, reject, "post")
+    comments = _keep_new(_split(chunk, "comment"), CommentModel.id, reject, "comment")
+
+    # resolve every reference of the chunk with one query per table
+    users = _existing(
+        UserModel.id,
+        {row["author_id"] for _, row in posts}
+        | {row["user_id"] for _, row in comments},
+    )
+    category_ids = dict(
+        db.session.execute(
+            db.select(CategoryModel.name, CategoryModel.id).where(
+                CategoryModel.name.in_(
+                    {name for _, row in posts for name in row.get("category_names", [])}
+                )
+            )
+        ).all()
+    )
+
+    new_posts, links = [], []
+    for line, row in posts:
+        names = list(dict.fromkeys(row.pop("category_names", [])))
+        missing = [name for name in names if name not in category_ids]
+        if row["author_id"] not in users:
+            reject(line, {"author_id": ["User not found."]})
+        elif missing:
+            reject(line, {"category_names": [f"Not found: {', '.join(missing)}."]})
+        else:
+            new_posts.append((line, row))
+            links.extend(
+                {"post_id": row["id"], "category_id": category_ids[name]}
+                for name in names
+            )
+    if new_posts:
+        _insert(PostModel, [row for _, row in new_posts])
+        current_app.search.index_new_posts([row for _, row in new_posts])
+    if links:
+        _insert(PostCategoryModel, links)
+
+    known_posts = _existing(PostModel.id, {row["post_id"] for _, row in comments})
+    new_comments = []
+    for line, row in comments:
+        if row["post_id"] not in known_posts:
+            reject(line, {"post_id": ["Post not found."]})
+        elif row["user_id"] not in users:
+            reject(line, {"user_id": ["User not found."]})
+        else:
+            new_comments.append((line, row))
+    if new_comments:
+        _insert(CommentModel, [row for _, row in new_comments])
+
+    # bulk inserts bypass the ORM hooks that keep the counters
+    counters.recount(UserModel, {row["author_id"] for _, row in new_posts})
+    counters.recount(CategoryModel, {link["category_id"] for link in links})
+    counters.recount(PostModel, {row["post_id"] for _, row in new_comments})
+
+    return new_categories, new_posts, new_comments, links, category_ids
+
+
+def _write_chunk(chunk, report):
+    """Insert one chunk in a single transaction and return the cache tags."""
+    rejected = set()
+
+    def reject(line, errors):
+        rejected.add(line)
+        report.fail(line, errors)
+
+    try:
+        new_categories, new_posts, new_comments, links, category_ids = _stage_chunk(
+            chunk, reject
+        )
+        db.session.commit()
+    except SQLAlchemyError as e:
+        # e.g. a category name or author changed by another request since it
+        # was checked: nothing of the chunk is written, every line it would
+        # have written is reported
+        db.session.rollback()
+        for line, _, _ in chunk:
+            if line not in rejected:
+                report.fail(
+                    line, {"_chunk": [f"Database error: {e.__class__.__name__}."]}
+                )
+        return set()
+
+    report.imported["categories"] += len(new_categories)
+    report.imported["posts"] += len(new_posts)
+    report.imported["comments"] += len(new_comments)
+
+    if new_categories:
+        current_app.category_index.bump()
+    tags = {"categories"} if new_categories else set()
+    if new_posts:
+        tags.add("posts")
+        tags.update(f"author-posts:{row['author_id']}" for _, row in new_posts)
+        tags.update(f"category-posts:{name}" for name in category_ids)
+    if links:
+        tags.add(CATEGORY_COUNTS_TAG)
+    # cached post pages show comment_count
+    if new_comments:
+        tags.update(comment_write_tags({row["post_id"] for _, row in new_comments}))
+    return tags
+
+
+def import_ndjson(lines, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Import categories, posts and comments from NDJSON lines.
+
+    Each line is an object with a ``type`` of ``category``, ``post`` or
+    ``comment``, validated with the matching import schema. Lines are read
+    lazily and written ``chunk_size`` at a time, one commit per chunk, so
+    memory use does not grow with the input. Within a chunk categories are
+    written before posts and posts before comments, so a line may refer to
+    anything defined earlier in the stream.
+    """
+    report = ImportReport()
+    chunk = []
+
+    def flush():
+        tags = _write_chunk(chunk, report)
+        if tags:
+            current_app.cache.invalidate(*tags)
+        chunk.clear()
+
+    for line_number, raw in enumerate(lines, start=1):
+        if not raw.strip():
+            continue
+        try:
+            kind, row = _parse(raw)
+        except ValidationError as e:
+            report.fail(line_number, e.messages)
+            continue
+        chunk.append((line_number, kind, row))
+        if len(chunk) >= chunk_size:
+            flush()
+
+    if chunk:
+        flush()
+    return report.as_dict()
@@ -0,0 +1,220 @@
+import functools
+import hashlib
+import logging
+
+import redis
+from flask import Response, current_app, g, request
+from flask_smorest.utils import get_appcontext
+from werkzeug.exceptions import HTTPException
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "cache:"
+STATS_KEY = "cache:stats"
+# on every cached category response, which shows post_count
+CATEGORY_COUNTS_TAG = "category-counts"
+# on cached post pages whose items show comment_count without their id, which
+# comment writes can't reach through post:<id>
+COMMENT_COUNTS_TAG = "comment-counts"
+
+
+class ResponseCache:
+    """Redis-backed cache of serialized GET responses.
+
+    Every entry is registered under a set of tags (``post:<id>``,
+    ``author:<id>``, ...); write handlers call ``invalidate`` with the tags
+    they affect once their transaction has committed. Hit and miss counters
+    live in Redis so they add up across workers.
+
+    With read replicas, a response read from a replica that hasn't caught up
+    with a write yet must not be stored after that write's invalidation:
+    invalidated tags are fenced for ``fence_seconds``, and replica responses
+    under a fenced tag are served but not stored.
+    """
+
+    def __init__(self, connection, ttls, fence_seconds=0):
+        self.connection = connection
+        self.ttls = ttls
+        self.fence_seconds = fence_seconds
+
+    @staticmethod
+    def _key(route):
+        # args are sorted so ?a=1&b=2 and ?b=2&a=1 share an entry
+        args = sorted(request.args.items(multi=True))
+        raw = f"{request.path}?{args}".encode()
+        return f"{KEY_PREFIX}{route}:{hashlib.sha1(raw).hexdigest()}"
+
+    def get(self, route, key):
+        # hits are derived as requests - misses, so a hit is one round trip
+        try:
+            pipe = self.connection.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.hincrby(STATS_KEY, f"{route}:requests", 1)
+            body, _ = pipe.execute()
+            return body
+        except redis.RedisError:
+            logger.exception("Response cache read failed.")
+            return None
+
+    def set(self, route, key, body, ttl, tags, replica=False):
+        # the tag sets only have to outlive the longest-lived entry
+        tag_ttl = max(self.ttls.values())
+        try:
+            if replica and self.fence_seconds and tags:
+                fences = [f"{KEY_PREFIX}fence:{tag}" for tag in tags]
+                if self.connection.exists(*fences):
+                    self.connection.hincrby(STATS_KEY, f"{route}:misses", 1)
+                    return
+            pipe = self.connection.pipeline(transaction=False)
+            pipe.hincrby(STATS_KEY, f"{route}:misses", 1)
+            pipe.set(key, body, ex=ttl)
+            for tag in tags:
+                tag_key = f"{KEY_PREFIX}tag:{tag}"
+                pipe.sadd(tag_key, key)
+                pipe.expire(tag_key, tag_ttl)
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception("Response cache write failed.")
+
+    def count_miss(self, route):
+        try:
+            self.connection.hincrby(STATS_KEY, f"{route}:misses", 1)
+        except redis.RedisError:
+            logger.exception("Response cache write failed.")
+
+    def invalidate(self, *tags):
+        tag_keys = [f"{KEY_PREFIX}tag:{tag}" for tag in tags]
+        if not tag_keys:
+            return
+        try:
+            pipe = self.connection.pipeline(transaction=False)
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            members = pipe.execute()
+            # remove only what was read, so an entry stored in between keeps
+            # its tag and can still be invalidated later
+            pipe = self.connection.pipeline(transaction=False)
+            for tag_key, keys in zip(tag_keys, members):
+                if keys:
+                    pipe.delete(*keys)
+                    pipe.srem(tag_key, *keys)
+            if self.fence_seconds:
+                for tag in tags:
+                    pipe.set(f"{KEY_PREFIX}fence:{tag}", 1, ex=self.fence_seconds)
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception("Response cache invalidation failed.")
+
+    def stats(self):
+        counters = {
+            key.decode(): int(value)
+            for key, value in self.connection.hgetall(STATS_KEY).items()
+        }
+        routes = {}
+        for name, value in counters.items():
+            route, counter = name.rsplit(":", 1)
+            routes.setdefault(route, {"requests": 0, "misses": 0})[counter] = value
+        for route, counts in routes.items():
+            counts["hits"] = counts["requests"] - counts["misses"]
+            counts["ttl"] = self.ttls.get(route)
+        return routes
+
+
+def cached(route, tags):
+    """Serve a JSON GET response from the cache.
+
+    Goes between ``jwt_required`` and ``blp.etag``/``blp.response``, so
+    authentication still runs on every request. The response's ETag is stored
+    with it and conditional requests get a 304 straight from the cache.
+    ``tags`` is called with the dumped result on a miss and returns the tags
+    to store the entry under.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = current_app.cache
+            ttl = cache.ttls.get(route, 0)
+            if not ttl:
+                return func(*args, **kwargs)
+
+            key = cache._key(route)
+            entry = cache.get(route, key)
+            if entry is not None:
+                # entries are stored as b"<etag>\n<body>"
+                etag, _, body = entry.partition(b"\n")
+                etag = etag.decode()
+                if etag and etag in request.if_none_match:
+                    response = Response(status=304)
+                else:
+                    response = Response(body, 200, mimetype="application/json")
+                if etag:
+                    response.set_etag(etag)
+                return response
+
+            try:
+                response = func(*args, **kwargs)
+            except HTTPException:  # 304/404 raised by the view
+                cache.count_miss(route)
+                raise
+            if response.status_code == 200:
+                result = get_appcontext()["result_dump"]
+                etag, _ = response.get_etag()
+                entry = (etag or "").encode() + b"\n" + response.get_data()
+                replica = g.get("replica") is not None
+                cache.set(route, key, entry, ttl, tags(result), replica=replica)
+            else:
+                cache.count_miss(route)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# tags for entries that embed posts (detail or list items). a sparse list
+# item (?fields=) may leave out any of them, but then it doesn't show what
+# the tag would invalidate it for; its page tags still cover the post itself
+def post_tags(post):
+    tags = set()
+    if "id" in post:
+        tags.add(f"post:{post['id']}")
+    if "author" in post:
+        tags.add(f"author:{post['author']['id']}")
+    tags.update(f"category:{category['id']}" for category in post.get("categories", ()))
+    return tags
+
+
+# tags for a page of posts: its items plus the filters that select it, so a
+# new post only invalidates the pages it could appear on
+def post_page_tags(page):
+    tags = set().union(*(post_tags(post) for post in page["items"]))
+    if any("comment_count" in post and "id" not in post for post in page["items"]):
+        tags.add(COMMENT_COUNTS_TAG)
+    author_id = request.args.get("author_id")
+    category_names = request.args.getlist("category")
+    if author_id:
+        tags.add(f"author-posts:{author_id}")
+    tags.update(f"category-posts:{name}" for name in category_names)
+    if not author_id and not category_names:
+        tags.add("posts")
+    return tags
+
+
+def comment_write_tags(post_ids):
+    """Tags to invalidate after comments on ``post_ids`` are created or deleted."""
+    return {COMMENT_COUNTS_TAG, *(f"post:{post_id}" for post_id in post_ids)}
+
+
+def post_write_tags(post, category_names=()):
+    """Tags to invalidate after a post is created, changed or deleted."""
+    tags = {
+        f"post:{post.id}",
+        "posts",
+        f"author-posts:{post.author_id}",
+        *(f"category-posts:{name}" for name in category_names),
+    }
+    if category_names:
+        # the categories' post_count changed
+        tags.add(CATEGORY_COUNTS_TAG)
+    return tags
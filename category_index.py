@@ -0,0 +1,75 @@
+import logging
+import threading
+
+import redis
+from sqlalchemy.orm import make_transient_to_detached
+
+from db import db
+from models import CategoryModel
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryIndex:
+    """Per-worker name -> id map of categories for post writes.
+
+    Categories only change through the admin endpoints, which call ``bump``
+    after committing. Every worker compares its copy against the shared
+    version counter in Redis (one GET instead of a database query) and
+    reloads the map when it moved.
+    """
+
+    VERSION_KEY = "categories:version"
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._version = None
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def bump(self):
+        try:
+            self.connection.incr(self.VERSION_KEY)
+        except redis.RedisError:
+            logger.exception("Category index version bump failed.")
+
+    def _current_ids(self):
+        try:
+            version = int(self.connection.get(self.VERSION_KEY) or 0)
+        except redis.RedisError:
+            # without the counter a cached map could be stale: read the table
+            logger.exception("Category index version check failed.")
+            version = None
+
+        with self._lock:
+            if version is not None and version == self._version:
+                return self._ids
+
+        rows = db.session.execute(db.select(CategoryModel.name, CategoryModel.id))
+        ids = {name: category_id for name, category_id in rows}
+        with self._lock:
+            if version is not None:
+                self._version, self._ids = version, ids
+        return ids
+
+    @staticmethod
+    def _attach(category_id, name):
+        # put the row in the session as if it had been loaded, without a SELECT
+        key = db.session.identity_key(CategoryModel, category_id)
+        category = db.session.identity_map.get(key)
+        if category is None:
+            category = CategoryModel(id=category_id, name=name)
+            make_transient_to_detached(category)
+            db.session.add(category)
+        return category
+
+    def resolve(self, names):
+        """Return the categories named in ``names``, or None if any is missing.
+
+        Duplicate names are collapsed, keeping the first occurrence.
+        """
+        names = list(dict.fromkeys(names))
+        ids = self._current_ids()
+        if any(name not in ids for name in names):
+            return None
+        return [self._attach(ids[name], name) for name in names]
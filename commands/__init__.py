@@ -0,0 +1,27 @@
+from commands.bulk_export import export_command
+from commands.bulk_import import import_ndjson_command
+from commands.email_benchmark import benchmark_email
+from commands.metrics_benchmark import benchmark_metrics
+from commands.pagination_check import check_pagination
+from commands.password_benchmark import benchmark_password_hashing
+from commands.query_counts import check_query_counts
+from commands.query_plans import check_query_plans
+from commands.reconcile_counters import reconcile_counters
+from commands.seed import seed_command
+from commands.serialization_benchmark import benchmark_serialization
+from commands.sync_replicas import sync_sqlite_replicas
+
+
+def register_commands(app):
+    app.cli.add_command(check_query_plans)
+    app.cli.add_command(check_query_counts)
+    app.cli.add_command(check_pagination)
+    app.cli.add_command(import_ndjson_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(benchmark_password_hashing)
+    app.cli.add_command(benchmark_email)
+    app.cli.add_command(benchmark_metrics)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(benchmark_serialization)
+    app.cli.add_command(reconcile_counters)
+    app.cli.add_command(sync_sqlite_replicas)
@@ -0,0 +1,29 @@
+import click
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+
+from bulk_export import BATCH_SIZE, EXPORT_FORMATS, EXPORTS, export_rows
+
+
+@click.command("export")
+@click.argument("kind", type=click.Choice(list(EXPORTS)))
+@click.option(
+    "--format", "fmt", type=click.Choice(list(EXPORT_FORMATS)), default="ndjson"
+)
+@click.option("--output", "-o", type=click.File("w"), default="-")
+@click.option("--batch-size", default=BATCH_SIZE, type=click.IntRange(min=1))
+@click.option("--category", multiple=True, help="Posts: category name.")
+@click.option("--author-id", help="Posts: author id.")
+@click.option("--q", help="Posts: full-text search.")
+@click.option("--post-id", help="Comments: post id.")
+@click.option("--user-id", help="Comments: commenter id.")
+@click.option("--created-after")
+@click.option("--created-before")
+@with_appcontext
+def export_command(kind, fmt, output, batch_size, category, **filters):
+    """Stream posts, comments or users as NDJSON or CSV (stdout by default)."""
+    # the same argument shape as the query string of GET /export/<kind>
+    args = MultiDict([("category", name) for name in category])
+    args.update({key: value for key, value in filters.items() if value})
+    for chunk in export_rows(kind, args, fmt, batch_size):
+        output.write(chunk)
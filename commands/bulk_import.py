@@ -0,0 +1,23 @@
+import json
+
+import click
+from flask.cli import with_appcontext
+
+from bulk_import import DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE, import_ndjson
+
+
+@click.command("import-ndjson")
+@click.argument("source", type=click.File("rb"))
+@click.option(
+    "--chunk-size",
+    default=DEFAULT_CHUNK_SIZE,
+    type=click.IntRange(1, MAX_CHUNK_SIZE),
+    help="Lines written per transaction.",
+)
+@with_appcontext
+def import_ndjson_command(source, chunk_size):
+    """Import categories, posts and comments from an NDJSON file ('-' for stdin)."""
+    report = import_ndjson(source, chunk_size)
+    click.echo(json.dumps(report, indent=2))
+    if report["failed"]:
+        raise SystemExit(1)
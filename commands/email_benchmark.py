@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+import requests
+
+import tasks
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # answers like Mailgun's messages API, without sending anything
+    protocol_version = "HTTP/1.1"
+    # keep-alive responses are written in two parts; without this the
+    # client's delayed ACK stalls every response by ~40ms
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"id": "<stand-in>", "message": "Queued."}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _rate(send, count, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as senders:
+        list(senders.map(send, range(count)))
+    return count / (time.perf_counter() - started)
+
+
+class UnpooledTransport(tasks.MailgunTransport):
+    # the old behaviour: a new connection for every message
+    def send(self, data):
+        response = requests.post(
+            self.url, auth=self.session.auth, data=data, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json().get("id")
+
+
+@click.command("benchmark-email")
+@click.option("--messages", default=2000, help="Emails per run.")
+@click.option("--concurrency", default=4, help="Concurrent senders.")
+def benchmark_email(messages, concurrency):
+    """Report emails per second against a local stand-in for Mailgun."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v3"
+
+    def registration(i):
+        return tasks.send_user_registration_email(f"user{i}@example.com", f"user{i}")
+
+    try:
+        for label, transport_class in (
+            ("new connection each", UnpooledTransport),
+            ("pooled session", tasks.MailgunTransport),
+        ):
+            tasks.set_transport(
+                transport_class("bench", "key", base_url, pool_size=concurrency)
+            )
+            rate = _rate(registration, messages, concurrency)
+            click.echo(f"{label:22} {rate:8.1f} emails/s")
+    finally:
+        tasks.set_transport(None)
+        server.shutdown()
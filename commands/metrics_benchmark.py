@@ -0,0 +1,43 @@
+import time
+
+import click
+from flask import Flask
+
+from db import db
+from metrics import init_metrics
+
+
+def _app(with_metrics):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    if with_metrics:
+        init_metrics(app)
+
+    @app.route("/ping")
+    def ping():
+        return "pong"
+
+    return app
+
+
+def _seconds_per_request(app, count):
+    client = app.test_client()
+    client.get("/ping")
+    started = time.perf_counter()
+    for _ in range(count):
+        client.get("/ping")
+    return (time.perf_counter() - started) / count
+
+
+@click.command("benchmark-metrics")
+@click.option("--requests", "count", default=5000, help="Requests per run.")
+def benchmark_metrics(count):
+    """Measure what request metrics add to each request."""
+    # the same trivial route with and without the hooks, so the difference
+    # is the instrumentation alone
+    bare = _seconds_per_request(_app(False), count)
+    timed = _seconds_per_request(_app(True), count)
+    click.echo(f"without metrics  {bare * 1e6:8.1f} us/request")
+    click.echo(f"with metrics     {timed * 1e6:8.1f} us/request")
+    click.echo(f"overhead         {(timed - bare) * 1e6:8.1f} us/request")
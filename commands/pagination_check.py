@@ -0,0 +1,118 @@
+import sys
+import uuid
+from datetime import datetime
+
+import click
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert, text
+
+from commands.query_counts import scratch_app
+from db import db
+from enums.roles import UserRole
+from models import PostModel, UserModel
+
+SECOND = datetime(2020, 1, 1, 10, 0, 0)
+
+
+def _fill():
+    """Posts around one second, stored both ways SQLite stores a timestamp."""
+    user_id = str(uuid.uuid4())
+    db.session.execute(
+        insert(UserModel),
+        [
+            {
+                "id": user_id,
+                "username": "author",
+                "email": "author@example.com",
+                "password_hash": "-",
+                "role": UserRole.ADMIN.value,
+            }
+        ],
+    )
+    # written from Python: "2020-01-01 10:00:00.000000"
+    times = [SECOND] * 3 + [SECOND.replace(microsecond=500000)] * 2
+    times += [SECOND.replace(second=1), SECOND.replace(minute=0, hour=9)]
+    db.session.execute(
+        insert(PostModel),
+        [
+            {
+                "id": str(uuid.uuid4()),
+                "title": f"post {n}",
+                "content": "content",
+                "author_id": user_id,
+                "created_at": created_at,
+            }
+            for n, created_at in enumerate(times)
+        ],
+    )
+    # filled in by CURRENT_TIMESTAMP: "2020-01-01 10:00:00"
+    for n in range(3):
+        db.session.execute(
+            text(
+                "INSERT INTO posts (id, title, content, author_id, created_at, "
+                "updated_at) VALUES (:id, 'default', 'content', :author, "
+                "'2020-01-01 10:00:00', '2020-01-01 10:00:00')"
+            ),
+            {"id": str(uuid.uuid4()), "author": user_id},
+        )
+    db.session.commit()
+    return user_id
+
+
+def _walk(client, headers, limit, total):
+    """Ids page by page to the end with next_cursor, then back with prev_cursor.
+
+    Stops early once a direction returned more than ``total`` ids, so a
+    cursor that keeps returning the same row can't loop forever.
+    """
+
+    def page(cursor):
+        query = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/posts", query_string=query, headers=headers).get_json()
+        return [item["id"] for item in body["items"]], body
+
+    forward, (ids, body) = [], page(None)
+    while True:
+        forward += ids
+        if not body["next_cursor"] or len(forward) > total:
+            break
+        ids, body = page(body["next_cursor"])
+    backward = ids
+    while body["prev_cursor"] and len(backward) <= total:
+        ids, body = page(body["prev_cursor"])
+        backward = ids + backward
+    return forward, backward
+
+
+@click.command("check-pagination")
+def check_pagination():
+    """Fail if paging through posts skips or repeats rows from the same second."""
+    app = scratch_app()
+    with app.app_context():
+        user_id = _fill()
+        token = create_access_token(
+            identity=user_id, additional_claims={"role": UserRole.ADMIN.value}
+        )
+        headers = {"Authorization": f"Bearer {token}"}
+        client = app.test_client()
+        expected = [
+            item["id"]
+            for item in client.get("/posts?limit=100", headers=headers).get_json()[
+                "items"
+            ]
+        ]
+
+        failed = False
+        for limit in (1, 2, 3):
+            forward, backward = _walk(client, headers, limit, len(expected))
+            if forward == expected and backward == expected:
+                click.echo(f"ok    limit={limit}")
+                continue
+            failed = True
+            click.echo(
+                f"FAIL  limit={limit}: {len(expected)} posts, {len(forward)} paging "
+                f"forward ({len(set(forward))} distinct), {len(backward)} back"
+            )
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,64 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from passwords import HasherBusy, PasswordHasher
+
+
+def _logins_per_second(hasher, password_hash, seconds, concurrency):
+    # a login is one verify; count how many finish (and how many are
+    # rejected with HasherBusy) in the given time with `concurrency` callers
+    deadline = time.perf_counter() + seconds
+
+    def caller():
+        done = busy = 0
+        while time.perf_counter() < deadline:
+            try:
+                hasher.verify(password_hash, "benchmark-password")
+                done += 1
+            except HasherBusy:
+                busy += 1
+        return done, busy
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as callers:
+        results = list(callers.map(lambda _: caller(), range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return sum(r[0] for r in results) / elapsed, sum(r[1] for r in results)
+
+
+@click.command("benchmark-password-hashing")
+@click.option("--seconds", default=5.0, help="Duration of each run.")
+@click.option("--method", help="Werkzeug method string (default: the app's).")
+@click.option("--workers", default=os.cpu_count() or 1, help="Pool processes.")
+@click.option(
+    "--concurrency", default=0, help="Concurrent callers (default 2x workers)."
+)
+@with_appcontext
+def benchmark_password_hashing(seconds, method, workers, concurrency):
+    """Report logins per second per core for the password hashing setup."""
+    method = method or current_app.config["PASSWORD_HASH_METHOD"]
+    concurrency = concurrency or workers * 2
+
+    inline = PasswordHasher(method, workers=0, max_pending=1)
+    password_hash = inline.hash("benchmark-password")
+    click.echo(f"method          {password_hash.split('$', 1)[0]}")
+
+    per_core, _ = _logins_per_second(inline, password_hash, seconds, 1)
+    click.echo(f"inline          {per_core:8.1f} logins/s (1 core)")
+
+    pool = PasswordHasher(method, workers=workers, max_pending=concurrency)
+    try:
+        # the first call starts the pool processes, keep that out of the run
+        pool.verify(password_hash, "benchmark-password")
+        total, busy = _logins_per_second(pool, password_hash, seconds, concurrency)
+    finally:
+        pool.shutdown()
+    click.echo(
+        f"pool            {total:8.1f} logins/s ({workers} processes, "
+        f"{concurrency} callers) = {total / workers:.1f} per core, {busy} rejected"
+    )
@@ -0,0 +1,115 @@
+import os
+import sys
+import uuid
+
+import click
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, insert
+
+from db import db
+from enums.roles import UserRole
+from models import CategoryModel, PostCategoryModel, PostModel, UserModel
+
+# page sizes the counts are compared at; both fit in one page
+SIZES = (5, 50)
+
+
+def _uid():
+    return str(uuid.uuid4())
+
+
+def _fill(size):
+    """``size`` posts by different authors, ``size`` more by the first user and
+    a post of theirs in ``size`` categories. Returns (user id, that post's id)."""
+    users = [
+        {"id": _uid(), "username": f"user{n}", "email": f"user{n}@example.com"}
+        for n in range(size + 1)
+    ]
+    for user in users:
+        user.update(password_hash="-", role=UserRole.ADMIN.value)
+    categories = [{"id": _uid(), "name": f"category-{n}"} for n in range(size)]
+    posts, links = [], []
+    for n in range(size * 2):
+        author = users[0] if n < size else users[n - size + 1]
+        post = {"id": _uid(), "title": f"post {n}", "content": "content"}
+        posts.append({**post, "author_id": author["id"]})
+        names = categories if n == 0 else (categories[n % size],)
+        links += [{"post_id": post["id"], "category_id": c["id"]} for c in names]
+
+    for model, rows in (
+        (UserModel, users),
+        (CategoryModel, categories),
+        (PostModel, posts),
+        (PostCategoryModel, links),
+    ):
+        db.session.execute(insert(model), rows)
+    db.session.commit()
+    return users[0]["id"], posts[0]["id"]
+
+
+def scratch_app():
+    """The app on a fresh in-memory database, with nothing cached or limited."""
+    from app import create_app
+
+    # cached responses would skip the queries being checked
+    for route in ("POST_DETAIL", "POST_LIST", "CATEGORY_LIST", "CATEGORY_DETAIL"):
+        os.environ[f"CACHE_TTL_{route}"] = "0"
+    os.environ["SQL_PROFILING"] = "0"
+    os.environ["RATE_LIMIT_BACKEND"] = "off"
+    app = create_app(db_url="sqlite://")
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _counts(size):
+    app = scratch_app()
+    with app.app_context():
+        user_id, post_id = _fill(size)
+        token = create_access_token(
+            identity=user_id, additional_claims={"role": UserRole.ADMIN.value}
+        )
+
+        statements = 0
+
+        def count(*args):
+            nonlocal statements
+            statements += 1
+
+        event.listen(db.engine, "before_cursor_execute", count)
+        client = app.test_client()
+        headers = {"Authorization": f"Bearer {token}"}
+        counts = {}
+        for name, url in (
+            ("GET /posts", f"/posts?limit={size * 2}"),
+            ("GET /posts/<id>", f"/posts/{post_id}"),
+            ("GET /users/<id>/posts", f"/users/{user_id}/posts?limit={size}"),
+        ):
+            statements = 0
+            response = client.get(url, headers=headers)
+            if response.status_code != 200:
+                raise click.ClickException(f"{name}: {response.status_code}")
+            counts[name] = statements
+        event.remove(db.engine, "before_cursor_execute", count)
+    return counts
+
+
+@click.command("check-query-counts")
+def check_query_counts():
+    """Fail if a post route runs more queries for a bigger result."""
+    # a fresh in-memory database per size
+    small, large = (_counts(size) for size in SIZES)
+
+    failed = False
+    for name, count in small.items():
+        if large[name] != count:
+            failed = True
+            click.echo(
+                f"FAIL  {name}: {count} queries for {SIZES[0]} rows, "
+                f"{large[name]} for {SIZES[1]}"
+            )
+        else:
+            click.echo(f"ok    {name}: {count} queries")
+
+    if failed:
+        sys.exit(1)
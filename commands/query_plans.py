@@ -0,0 +1,120 @@
+import json
+import sys
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from werkzeug.datastructures import MultiDict
+
+from db import db
+from models import CommentModel, PostModel, UserModel
+from resources.post import filter_posts
+
+HOT_TABLES = {"posts", "comments", "post_categories", "categories", "users"}
+# any id works: plans depend on the indexes, not on the row existing
+SAMPLE_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def _post_page(query):
+    return query.order_by(PostModel.created_at.desc(), PostModel.id.desc()).limit(21)
+
+
+def _comment_page(query):
+    order = (CommentModel.created_at.desc(), CommentModel.id.desc())
+    return query.order_by(*order).limit(21)
+
+
+def hot_queries():
+    """The statements behind the busiest endpoints, built like the views do."""
+    posts = PostModel.query
+    search, _, _ = current_app.search.search(posts, "flask")
+    return {
+        "GET /posts": _post_page(posts),
+        "GET /posts?author_id=": _post_page(
+            filter_posts(posts, MultiDict({"author_id": SAMPLE_ID}))
+        ),
+        "GET /posts?category=": _post_page(
+            filter_posts(posts, MultiDict([("category", "python")]))
+        ),
+        "GET /posts?q=": search.limit(21),
+        "GET /posts/<id>/comments": _comment_page(
+            CommentModel.query.filter(CommentModel.post_id == SAMPLE_ID)
+        ),
+        "GET /comments": _comment_page(CommentModel.query),
+        "comments by user": CommentModel.query.filter(
+            CommentModel.user_id == SAMPLE_ID
+        ),
+        "POST /login": UserModel.query.filter(
+            db.or_(
+                db.func.lower(UserModel.email) == "someone",
+                db.func.lower(UserModel.username) == "someone",
+            )
+        ),
+    }
+
+
+def _sql(query):
+    return str(
+        query.statement.compile(
+            dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def _postgres_seq_scans(sql):
+    # with seq scans priced out, one only shows up when no index is usable,
+    # so the check does not depend on how much data is seeded
+    db.session.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans, nodes = [], [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] in HOT_TABLES:
+            scans.append(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+
+def _sqlite_seq_scans(sql):
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    scans = []
+    for row in rows:
+        # "SCAN posts" is a full scan, "SCAN posts USING INDEX ..." is not
+        words = row.detail.split()
+        if words[0] == "SCAN" and len(words) == 2 and words[1] in HOT_TABLES:
+            scans.append(words[1])
+    return scans
+
+
+def seq_scans():
+    """Hot query name -> the tables its plan scans sequentially."""
+    if db.engine.dialect.name == "postgresql":
+        find_seq_scans = _postgres_seq_scans
+    else:
+        find_seq_scans = _sqlite_seq_scans
+
+    scans = {}
+    for name, query in hot_queries().items():
+        scans[name] = find_seq_scans(_sql(query))
+        db.session.rollback()
+    return scans
+
+
+@click.command("check-query-plans")
+@with_appcontext
+def check_query_plans():
+    """EXPLAIN the hot queries and fail if any needs a sequential scan."""
+    failed = False
+    for name, scans in seq_scans().items():
+        if scans:
+            failed = True
+            click.echo(f"FAIL  {name}: sequential scan on {', '.join(scans)}")
+        else:
+            click.echo(f"ok    {name}")
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,27 @@
+import click
+from flask.cli import with_appcontext
+
+from counters import COUNTERS, reconcile
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+@click.command("reconcile-counters")
+@click.option(
+    "--batch-size",
+    default=DEFAULT_BATCH_SIZE,
+    type=click.IntRange(1),
+    show_default=True,
+    help="Rows checked per statement and transaction.",
+)
+@click.option("--dry-run", is_flag=True, help="Only count the rows that drifted.")
+@with_appcontext
+def reconcile_counters(batch_size, dry_run):
+    """Recompute post and comment counters that drifted from the data."""
+    for model in COUNTERS:
+        counter = COUNTERS[model][0]
+        fixed = 0
+        for batch in reconcile(model, batch_size, dry_run):
+            fixed += batch
+        action = "wrong" if dry_run else "repaired"
+        click.echo(f"{model.__tablename__}.{counter.key}: {fixed} {action}")
@@ -0,0 +1,46 @@
+import os
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from db import db
+from models import UserModel
+from seeding import SEED_PASSWORD, seed
+
+
+@click.command("seed")
+@click.option("--posts", default=100000, type=click.IntRange(1), show_default=True)
+@click.option("--users", type=click.IntRange(1), help="Default: posts / 10.")
+@click.option("--comments", type=click.IntRange(0), help="Default: posts * 2.")
+@click.option(
+    "--categories", type=click.IntRange(1), help="Default: posts / 100, 10 to 1000."
+)
+@click.option("--seed", "seed_value", default=0, show_default=True)
+@click.option(
+    "--workers",
+    default=os.cpu_count() or 1,
+    type=click.IntRange(1),
+    show_default="CPU count",
+    help="Processes generating and writing rows.",
+)
+@with_appcontext
+def seed_command(posts, users, comments, categories, seed_value, workers):
+    """Fill an empty database with synthetic users, posts and comments."""
+    if db.session.scalar(db.select(UserModel.id).limit(1)):
+        raise click.ClickException("The database already has users.")
+
+    written = {}
+    started = time.perf_counter()
+
+    def progress(kind, rows):
+        written[kind] = written.get(kind, 0) + rows
+        click.echo(f"\r{kind}: {written[kind]}", nl=False)
+
+    counts = seed(posts, users, comments, categories, seed_value, workers, progress)
+    click.echo(
+        f"\rseeded {counts['users']} users, {counts['posts']} posts, "
+        f"{counts['comments']} comments and {counts['categories']} categories "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    click.echo(f"user0 is an admin; every password is {SEED_PASSWORD!r}")
@@ -0,0 +1,98 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask.json.provider import DefaultJSONProvider
+
+import serializers
+from json_provider import OrjsonProvider
+from models import CategoryModel, CommentModel, PostModel, UserModel
+from schemas import CommentPageSchema, PostPageSchema
+
+
+def _pages(count):
+    # transient objects shaped like a list endpoint's page
+    started = datetime(2024, 1, 1)
+    authors = [UserModel(id=str(uuid.uuid4()), username=f"user{n}") for n in range(20)]
+    categories = [
+        CategoryModel(id=str(uuid.uuid4()), name=f"category-{n}") for n in range(10)
+    ]
+    posts, comments = [], []
+    for n in range(count):
+        created_at = started + timedelta(minutes=n)
+        post = PostModel(
+            id=str(uuid.uuid4()),
+            title=f"post number {n}",
+            content="lorem ipsum dolor sit amet " * 40,
+            author=authors[n % len(authors)],
+            categories=categories[n % 7 : n % 7 + 3],
+            created_at=created_at,
+            updated_at=created_at,
+        )
+        post.comment_count = n % 13
+        posts.append(post)
+        comments.append(
+            CommentModel(
+                id=str(uuid.uuid4()),
+                content=f"comment number {n}",
+                user=authors[n % len(authors)],
+                post_id=post.id,
+                created_at=created_at,
+            )
+        )
+    cursor = {
+        "next_cursor": "WyJuZXh0IiwgIjIwMjQtMDEtMDEiLCAiYWJjIl0",
+        "prev_cursor": None,
+    }
+    return {"items": posts, **cursor}, {"items": comments, **cursor}
+
+
+def _time(func, rounds):
+    func()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    return (time.perf_counter() - started) / rounds, result
+
+
+def _run(schema, page, provider, compiled, rounds):
+    serializers.COMPILED = compiled
+    try:
+        dump_seconds, dumped = _time(lambda: schema.dump(page), rounds)
+    finally:
+        serializers.COMPILED = True
+    encode_seconds, body = _time(lambda: provider.response(dumped).get_data(), rounds)
+    return dump_seconds, encode_seconds, dumped, body
+
+
+@click.command("benchmark-serialization")
+@click.option("--items", "count", default=1000, help="Items per page.")
+@click.option("--rounds", default=20, help="Pages serialized per measurement.")
+@with_appcontext
+def benchmark_serialization(count, rounds):
+    """Compare marshmallow + stdlib json with compiled dumps + orjson."""
+    app = current_app._get_current_object()
+    stdlib, orjson = DefaultJSONProvider(app), OrjsonProvider(app)
+    post_page, comment_page = _pages(count)
+    for name, schema, page in (
+        ("posts", PostPageSchema(), post_page),
+        ("comments", CommentPageSchema(), comment_page),
+    ):
+        before = _run(schema, page, stdlib, False, rounds)
+        after = _run(schema, page, orjson, True, rounds)
+        if before[2] != after[2] or before[3] != after[3]:
+            raise click.ClickException(
+                f"{name}: the two paths produce different output"
+            )
+        click.echo(
+            f"{name} ({count} per page, {len(after[3])} bytes, identical output)"
+        )
+        for label, (dump, encode, _, _) in (("current", before), ("fast", after)):
+            click.echo(
+                f"  {label:8} dump {dump * 1000:7.2f} ms  encode {encode * 1000:7.2f} ms"
+                f"  {count / (dump + encode):10.0f} items/s"
+            )
+        click.echo(f"  speedup  {(before[0] + before[1]) / (after[0] + after[1]):.1f}x")
@@ -0,0 +1,33 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from db import db
+
+
+@click.command("sync-sqlite-replicas")
+@with_appcontext
+def sync_sqlite_replicas():
+    """Copy a SQLite primary over its SQLite replicas (local replication)."""
+    if db.engine.dialect.name != "sqlite":
+        raise click.ClickException("The primary is not a SQLite database.")
+    keys = current_app.replicas.bind_keys
+    if not keys:
+        raise click.ClickException("No replicas configured (DATABASE_REPLICA_URLS).")
+
+    primary = db.engine.raw_connection()
+    try:
+        for key in keys:
+            engine = db.engines[key]
+            if engine.dialect.name != "sqlite":
+                click.echo(f"{key}: skipped, not SQLite")
+                continue
+            replica = engine.raw_connection()
+            try:
+                # the backup API copies a consistent snapshot page by page
+                primary.driver_connection.backup(replica.driver_connection)
+            finally:
+                replica.close()
+            click.echo(f"{key}: {engine.url.database} is up to date")
+    finally:
+        primary.close()
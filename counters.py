@@ -0,0 +1,181 @@
+from collections import Counter, defaultdict
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+
+from db import db
+from models import CategoryModel, CommentModel, PostCategoryModel, PostModel, UserModel
+
+# denormalized counter column -> the aggregate it caches, correlated to the
+# row being counted
+COUNTERS = {
+    UserModel: (
+        UserModel.post_count,
+        db.select(db.func.count(PostModel.id))
+        .where(PostModel.author_id == UserModel.id)
+        .scalar_subquery(),
+    ),
+    CategoryModel: (
+        CategoryModel.post_count,
+        db.select(db.func.count())
+        .select_from(PostCategoryModel)
+        .where(PostCategoryModel.category_id == CategoryModel.id)
+        .scalar_subquery(),
+    ),
+    PostModel: (
+        PostModel.comment_count,
+        db.select(db.func.count(CommentModel.id))
+        .where(CommentModel.post_id == PostModel.id)
+        .scalar_subquery(),
+    ),
+}
+DELTAS_KEY = "counter_deltas"
+
+
+def _unchanged(model):
+    # a counter bump is not an edit: keep onupdate columns (updated_at) as
+    # they are instead of letting the UPDATE refresh them
+    return {column: column for column in model.__table__.c if column.onupdate}
+
+
+def _post_deltas(post, sign, deltas):
+    deltas[UserModel, post.author_id] += sign
+    for category in post.categories:
+        deltas[CategoryModel, category.id] += sign
+
+
+def _cascade_deltas(session, users, deltas):
+    # the database deletes the users' posts and comments with them (ON DELETE
+    # CASCADE), so the counters those rows feed are read here; rows the
+    # session deletes itself are counted one by one above
+    user_ids = [user.id for user in users]
+    deleted = session.deleted
+    posts = [obj.id for obj in deleted if isinstance(obj, PostModel)]
+    comments = [obj.id for obj in deleted if isinstance(obj, CommentModel)]
+    connection = session.connection()
+    links = connection.execute(
+        db.select(PostCategoryModel.category_id, db.func.count())
+        .join(PostModel, PostModel.id == PostCategoryModel.post_id)
+        .where(PostModel.author_id.in_(user_ids), PostModel.id.not_in(posts))
+        .group_by(PostCategoryModel.category_id)
+    )
+    for category_id, count in links:
+        deltas[CategoryModel, category_id] -= count
+    # comments on other authors' posts; the posts of these users go anyway
+    commented = connection.execute(
+        db.select(CommentModel.post_id, db.func.count())
+        .join(PostModel, PostModel.id == CommentModel.post_id)
+        .where(
+            CommentModel.user_id.in_(user_ids),
+            CommentModel.id.not_in(comments),
+            PostModel.author_id.not_in(user_ids),
+        )
+        .group_by(CommentModel.post_id)
+    )
+    for post_id, count in commented:
+        deltas[PostModel, post_id] -= count
+
+
+# ORM writes (the API's handlers and their cascades) keep the counters in
+# step in the same transaction: deletions and category changes are read
+# before the flush, while the rows still exist, new rows after it, once
+# their keys are known
+@event.listens_for(Session, "before_flush")
+def _count_removals(session, flush_context, instances):
+    deltas = session.info.setdefault(DELTAS_KEY, Counter())
+    users = []
+    for obj in session.deleted:
+        if isinstance(obj, PostModel):
+            _post_deltas(obj, -1, deltas)
+        elif isinstance(obj, CommentModel):
+            deltas[PostModel, obj.post_id] -= 1
+        elif isinstance(obj, UserModel):
+            users.append(obj)
+    if users:
+        _cascade_deltas(session, users, deltas)
+    for obj in session.dirty:
+        if isinstance(obj, PostModel) and obj not in session.deleted:
+            history = inspect(obj).attrs.categories.history
+            for category in history.added:
+                deltas[CategoryModel, category.id] += 1
+            for category in history.deleted:
+                deltas[CategoryModel, category.id] -= 1
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_deltas(session, flush_context):
+    deltas = session.info.pop(DELTAS_KEY, Counter())
+    for obj in session.new:
+        if isinstance(obj, PostModel):
+            _post_deltas(obj, 1, deltas)
+        elif isinstance(obj, CommentModel):
+            deltas[PostModel, obj.post_id] += 1
+
+    # one UPDATE per table and delta, counting relative to the stored value
+    # so concurrent writers don't overwrite each other
+    grouped = defaultdict(list)
+    for (model, row_id), delta in deltas.items():
+        if delta and row_id is not None:
+            grouped[model, delta].append(row_id)
+    connection = session.connection()
+    for (model, delta), ids in grouped.items():
+        counter = COUNTERS[model][0]
+        connection.execute(
+            update(model)
+            .where(model.id.in_(ids))
+            .values({counter: counter + delta, **_unchanged(model)})
+        )
+
+
+def recount(model, ids):
+    """Set the counters of ``ids`` from their aggregates (bulk writes)."""
+    if not ids:
+        return
+    counter, actual = COUNTERS[model]
+    db.session.execute(
+        update(model)
+        .where(model.id.in_(list(ids)))
+        .values({counter: actual, **_unchanged(model)})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile(model, batch_size=None, dry_run=False):
+    """Repair counters of ``model`` that drifted from their aggregates.
+
+    Walks the table in primary key order, ``batch_size`` rows per statement
+    and commit (all at once if None), and yields the number of rows fixed,
+    or with ``dry_run`` found wrong, in each batch.
+    """
+    counter, actual = COUNTERS[model]
+    last = None
+    while True:
+        batch = db.true() if last is None else model.id > last
+        upper = None
+        if batch_size:
+            upper = db.session.scalar(
+                db.select(model.id)
+                .where(batch)
+                .order_by(model.id)
+                .offset(batch_size - 1)
+                .limit(1)
+            )
+            if upper is not None:
+                batch = db.and_(batch, model.id <= upper)
+        drifted = db.and_(batch, counter != actual)
+        if dry_run:
+            fixed = db.session.scalar(
+                db.select(db.func.count()).select_from(model).where(drifted)
+            )
+        else:
+            fixed = db.session.execute(
+                update(model)
+                .where(drifted)
+                .values({counter: actual, **_unchanged(model)})
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        db.session.commit()
+        yield fixed
+        if upper is None:
+            return
+        last = upper
@@ -0,0 +1,212 @@
+from contextlib import nullcontext
+
+from flask import current_app, has_app_context
+from rq import get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+
+from cache import CATEGORY_COUNTS_TAG, comment_write_tags
+from counters import recount
+from db import db
+from models import CategoryModel, CommentModel, PostCategoryModel, PostModel, UserModel
+
+# statuses of a deletion that is still to run, so asking again reuses it
+PENDING = (JobStatus.QUEUED, JobStatus.STARTED, JobStatus.DEFERRED, JobStatus.SCHEDULED)
+# a job's status stays readable this long after it ends
+RESULT_TTL = 3600
+FAILURE_TTL = 86400
+
+_worker_app = None
+
+
+def user_deletion_size(user):
+    """Rows deleting ``user`` takes with it: posts and every comment on or by them."""
+    own_posts = db.select(PostModel.id).where(PostModel.author_id == user.id)
+    comments = db.session.scalar(
+        db.select(db.func.count(CommentModel.id)).where(
+            db.or_(CommentModel.user_id == user.id, CommentModel.post_id.in_(own_posts))
+        )
+    )
+    return user.post_count + comments
+
+
+def post_deletion_size(post):
+    return post.comment_count
+
+
+def user_stale_tags(user_id):
+    # the user's posts and pages, plus the posts they commented on, whose
+    # comment_count drops
+    commented = db.session.scalars(
+        db.select(CommentModel.post_id)
+        .where(CommentModel.user_id == user_id)
+        .distinct()
+    )
+    return {
+        f"author:{user_id}",
+        f"author-posts:{user_id}",
+        "posts",
+        CATEGORY_COUNTS_TAG,
+        *comment_write_tags(commented),
+    }
+
+
+def _chunks(query, chunk_size):
+    # the caller deletes each chunk before the next one is read, so the same
+    # query keeps returning the rows that are left
+    while True:
+        rows = db.session.execute(query.limit(chunk_size)).all()
+        if not rows:
+            return
+        yield rows
+
+
+def _delete_comments(condition, chunk_size, progress):
+    query = db.select(CommentModel.id, CommentModel.post_id).where(condition)
+    for rows in _chunks(query, chunk_size):
+        post_ids = {row.post_id for row in rows}
+        db.session.execute(
+            db.delete(CommentModel)
+            .where(CommentModel.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        recount(PostModel, post_ids)
+        db.session.commit()
+        current_app.cache.invalidate(*comment_write_tags(post_ids))
+        progress(len(rows))
+
+
+def _delete_posts(condition, chunk_size, progress):
+    # their comments are gone by now; the database drops the category links
+    query = db.select(PostModel.id, PostModel.author_id).where(condition)
+    for rows in _chunks(query, chunk_size):
+        ids = [row.id for row in rows]
+        category_ids = db.session.scalars(
+            db.select(PostCategoryModel.category_id)
+            .where(PostCategoryModel.post_id.in_(ids))
+            .distinct()
+        ).all()
+        db.session.execute(
+            db.delete(PostModel)
+            .where(PostModel.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        recount(UserModel, {row.author_id for row in rows})
+        recount(CategoryModel, category_ids)
+        db.session.commit()
+        current_app.cache.invalidate(
+            CATEGORY_COUNTS_TAG, *(f"post:{post_id}" for post_id in ids)
+        )
+        progress(len(rows))
+
+
+def delete_user(user_id, chunk_size, progress=lambda rows: None):
+    """Delete a user with their posts and comments, ``chunk_size`` rows per commit.
+
+    Counters and cached responses are kept up to date chunk by chunk, so an
+    interrupted deletion leaves consistent data and can simply be rerun.
+    """
+    if db.session.get(UserModel, user_id) is None:
+        return
+    stale_tags = user_stale_tags(user_id)
+    current_app.search.remove_author_posts(user_id)
+    db.session.commit()
+
+    own_posts = db.select(PostModel.id).where(PostModel.author_id == user_id)
+    _delete_comments(CommentModel.user_id == user_id, chunk_size, progress)
+    _delete_comments(CommentModel.post_id.in_(own_posts), chunk_size, progress)
+    _delete_posts(PostModel.author_id == user_id, chunk_size, progress)
+
+    db.session.execute(
+        db.delete(UserModel)
+        .where(UserModel.id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    current_app.principals.invalidate(user_id)
+    current_app.cache.invalidate(*stale_tags)
+
+
+def delete_post(post_id, chunk_size, progress=lambda rows: None):
+    """Delete a post and its comments, ``chunk_size`` comments per commit."""
+    post = db.session.get(PostModel, post_id)
+    if post is None:
+        return
+    stale_tags = {
+        f"author-posts:{post.author_id}",
+        "posts",
+        *(f"category-posts:{category.name}" for category in post.categories),
+    }
+    current_app.search.remove_post(post_id)
+    db.session.commit()
+
+    _delete_comments(CommentModel.post_id == post_id, chunk_size, progress)
+    _delete_posts(PostModel.id == post_id, chunk_size, progress)
+    current_app.cache.invalidate(*stale_tags)
+
+
+def _app_context():
+    # jobs run in the worker, outside of any request: the worker process
+    # builds the app once and reuses it for every job
+    global _worker_app
+    if has_app_context():
+        return nullcontext()
+    if _worker_app is None:
+        from app import create_app
+
+        _worker_app = create_app()
+    return _worker_app.app_context()
+
+
+def _job_progress(total):
+    job = get_current_job()
+    done = 0
+
+    def progress(rows):
+        nonlocal done
+        done += rows
+        if job is not None:
+            job.meta["progress"] = {"deleted": done, "total": total}
+            job.save_meta()
+
+    progress(0)
+    return progress
+
+
+def delete_user_job(user_id):
+    with _app_context():
+        user = db.session.get(UserModel, user_id)
+        if user is None:
+            return
+        progress = _job_progress(user_deletion_size(user))
+        delete_user(user_id, current_app.config["DELETE_CHUNK_SIZE"], progress)
+
+
+def delete_post_job(post_id):
+    with _app_context():
+        post = db.session.get(PostModel, post_id)
+        if post is None:
+            return
+        progress = _job_progress(post_deletion_size(post) + 1)
+        delete_post(post_id, current_app.config["DELETE_CHUNK_SIZE"], progress)
+
+
+def enqueue_deletion(job, object_id, requested_by):
+    """Queue ``job`` for ``object_id``, or return the deletion already queued."""
+    queue = current_app.maintenance_queue
+    job_id = f"{job.__name__}-{object_id}"
+    try:
+        existing = Job.fetch(job_id, connection=queue.connection)
+        if existing.get_status() in PENDING:
+            return existing
+    except NoSuchJobError:
+        pass
+    return queue.enqueue(
+        job,
+        object_id,
+        job_id=job_id,
+        meta={"requested_by": requested_by},
+        job_timeout=-1,
+        result_ttl=RESULT_TTL,
+        failure_ttl=FAILURE_TTL,
+    )
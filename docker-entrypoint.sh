@@ -3,6 +3,13 @@
 # Run DB migrations using the app factory explicitly
 flask --app "app:create_app()" db upgrade
 
+# gunicorn workers share metrics through files in this directory; samples
+# of a previous run must not be merged into the new one
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus-metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# gunicorn.conf.py in the working directory is picked up automatically
 exec gunicorn \
     --reload \
     --bind 0.0.0.0:80 \
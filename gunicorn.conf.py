@@ -0,0 +1,16 @@
+import os
+
+from prometheus_client import multiprocess
+
+# threads, so a request waiting on the password hashing pool (or on the
+# database) doesn't hold the whole worker; PASSWORD_HASH_MAX_PENDING is
+# sized below this so logins alone can't take every thread.
+# the number of workers comes from WEB_CONCURRENCY or --workers
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+
+def child_exit(server, worker):
+    # drop the in-flight and pool gauges of a worker that exited
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
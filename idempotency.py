@@ -0,0 +1,185 @@
+import functools
+import hashlib
+import logging
+import uuid
+
+import redis
+from flask import Response, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+
+from metrics import IDEMPOTENT_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# for blp.doc(parameters=[...]) on idempotent routes
+IDEMPOTENCY_KEY_PARAMETER = {
+    "in": "header",
+    "name": HEADER,
+    "required": False,
+    "description": "Retries with the same key get the first response back "
+    "instead of repeating the request.",
+    "schema": {"type": "string", "maxLength": MAX_KEY_LENGTH},
+}
+
+
+class IdempotencyKeys:
+    """Responses of writes stored under the client's ``Idempotency-Key``.
+
+    The first request with a key takes a lock for ``lock_seconds``, which
+    must outlast the slowest view using it, and its successful response is
+    kept for ``ttl`` seconds; a retry is answered from Redis without running
+    the view. A duplicate that arrives while the first request is running is
+    turned away at once with a 409, so it doesn't hold a worker thread.
+    Error responses are not kept, so the client can retry them.
+    """
+
+    KEY_PREFIX = "idempotency:"
+
+    def __init__(self, connection, ttl=86400, lock_seconds=60):
+        self.connection = connection
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+
+    def claim(self, key):
+        """The stored response for ``key``, or a lock token if it is ours to run.
+
+        Returns ``(stored, token)`` where at most one is set; both None means
+        another request holds the key. One round trip.
+        """
+        token = uuid.uuid4().hex
+        pipe = self.connection.pipeline(transaction=False)
+        pipe.hgetall(key)
+        pipe.set(f"{key}:lock", token, nx=True, ex=self.lock_seconds)
+        stored, locked = pipe.execute()
+        if stored:
+            if locked:
+                self.connection.delete(f"{key}:lock")
+            return stored, None
+        return None, token if locked else None
+
+    def store(self, key, token, fingerprint, response):
+        pipe = self.connection.pipeline(transaction=False)
+        pipe.hset(
+            key,
+            mapping={
+                "fingerprint": fingerprint,
+                "status": response.status_code,
+                "mimetype": response.mimetype or "",
+                "body": response.get_data(),
+            },
+        )
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        self.release(key, token)
+
+    def release(self, key, token):
+        # only our own lock: it may have expired and been taken by a retry.
+        # if this fails the lock just expires
+        lock = f"{key}:lock"
+        try:
+            if self.connection.get(lock) == token.encode():
+                self.connection.delete(lock)
+        except redis.RedisError:
+            logger.exception("Idempotency lock release failed.")
+
+
+def _owner():
+    try:
+        return get_jwt_identity() or "anonymous"
+    except RuntimeError:  # the route takes no token
+        return "anonymous"
+
+
+def _fingerprint():
+    raw = b"\n".join(
+        (request.method.encode(), request.full_path.encode(), request.get_data())
+    )
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _error(status, message, error):
+    response = jsonify({"message": message, "error": error})
+    response.status_code = status
+    return response
+
+
+def idempotent(route):
+    """Make a write safe to retry with an ``Idempotency-Key`` header.
+
+    Goes under ``jwt_required`` (keys are per user; routes without a token
+    share one namespace) and above ``blp.arguments``, so a retry doesn't even
+    parse the body again. Requests without the header run as usual.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            client_key = request.headers.get(HEADER)
+            if client_key is None:
+                return func(*args, **kwargs)
+            if not client_key or len(client_key) > MAX_KEY_LENGTH:
+                return _error(
+                    400,
+                    f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters.",
+                    "invalid_idempotency_key",
+                )
+
+            keys = current_app.idempotency
+            owner = _owner()
+            digest = hashlib.sha256(client_key.encode()).hexdigest()
+            key = f"{keys.KEY_PREFIX}{route}:{owner}:{digest}"
+            fingerprint = _fingerprint()
+
+            try:
+                stored, token = keys.claim(key)
+            except redis.RedisError:
+                # fail open: the request runs as if it had no key
+                logger.exception("Idempotency key lookup failed.")
+                return func(*args, **kwargs)
+
+            if stored:
+                if stored[b"fingerprint"].decode() != fingerprint:
+                    IDEMPOTENT_REQUESTS.labels(route, "mismatch").inc()
+                    return _error(
+                        422,
+                        f"{HEADER} was already used for a different request.",
+                        "idempotency_key_reused",
+                    )
+                IDEMPOTENT_REQUESTS.labels(route, "replayed").inc()
+                response = Response(
+                    stored[b"body"],
+                    int(stored[b"status"]),
+                    mimetype=stored[b"mimetype"].decode() or None,
+                )
+                response.headers["Idempotent-Replayed"] = "true"
+                return response
+            if token is None:
+                IDEMPOTENT_REQUESTS.labels(route, "in_progress").inc()
+                response = _error(
+                    409,
+                    f"A request with this {HEADER} is still in progress.",
+                    "idempotency_key_in_use",
+                )
+                response.headers["Retry-After"] = "1"
+                return response
+
+            IDEMPOTENT_REQUESTS.labels(route, "executed").inc()
+            try:
+                response = current_app.make_response(func(*args, **kwargs))
+            except Exception:
+                keys.release(key, token)
+                raise
+            try:
+                if 200 <= response.status_code < 300:
+                    keys.store(key, token, fingerprint, response)
+                else:
+                    keys.release(key, token)
+            except redis.RedisError:
+                logger.exception("Idempotency key write failed.")
+            return response
+
+        return wrapper
+
+    return decorator
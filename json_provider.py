@@ -0,0 +1,52 @@
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+# datetimes and dataclasses go through Flask's ``default`` so they render as
+# before (HTTP dates, asdict); keys stay sorted like the stdlib provider's
+ORJSON_OPTIONS = (
+    orjson.OPT_SORT_KEYS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    Compact output matches the stdlib provider's except that non-ASCII text
+    is written as UTF-8 rather than ``\\u`` escapes. Anything orjson can't
+    encode (integers over 64 bits, ``dumps`` keyword arguments such as
+    ``indent``) falls back to the stdlib provider.
+    """
+
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(
+                obj, default=self.default, option=ORJSON_OPTIONS
+            ).decode()
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            # indented output for debugging
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(
+                obj,
+                default=self.default,
+                option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE,
+            )
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
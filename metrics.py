@@ -0,0 +1,226 @@
+import os
+import time
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from redis import RedisError
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import Pool, QueuePool
+
+from db import db
+
+# With PROMETHEUS_MULTIPROC_DIR set, every gunicorn worker writes its samples
+# to files there and /metrics merges them, so a scrape covers all workers
+# whichever one answers it. Gauges say how the workers' values combine.
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request.",
+    ["blueprint", "route", "method"],
+)
+REQUESTS = Counter(
+    "http_requests_total",
+    "Requests handled, by response status.",
+    ["blueprint", "route", "method", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests being handled right now.",
+    multiprocess_mode="livesum",
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Size of response bodies (streamed responses are not counted).",
+    ["blueprint", "route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed while handling a request.",
+    ["blueprint", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool, including opening a new one.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Connections checked out of the pool.",
+    multiprocess_mode="livesum",
+)
+POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Connections the pool keeps open, before overflow.",
+    multiprocess_mode="livesum",
+)
+REPLICA_READS = Counter(
+    "db_replica_reads_total",
+    "Read-only requests by where they read: replica, primary (no healthy "
+    "replica or the user just wrote) or fallback (the replica failed).",
+    ["target"],
+)
+IDEMPOTENT_REQUESTS = Counter(
+    "idempotent_requests_total",
+    "Writes sent with an Idempotency-Key: executed, replayed from the stored "
+    "response, in_progress (a duplicate arrived while the first request was "
+    "still running) or mismatch (the key was reused for another request).",
+    ["route", "outcome"],
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds",
+    "Round trip of Redis commands (a pipeline counts as one).",
+    ["command"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def engine_options(database_url):
+    # in-memory SQLite needs its default single-connection pool
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {"poolclass": TimedQueuePool}
+
+
+@event.listens_for(Pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_IN_USE.inc()
+
+
+@event.listens_for(Pool, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    POOL_IN_USE.dec()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "query_count" in g:
+        g.query_count += 1
+
+
+def instrument_redis(connection):
+    """Time every command and pipeline sent through ``connection``."""
+    execute_command = connection.execute_command
+    pipeline = connection.pipeline
+
+    def timed_execute_command(*args, **options):
+        started = time.perf_counter()
+        try:
+            return execute_command(*args, **options)
+        finally:
+            REDIS_LATENCY.labels(str(args[0]).upper()).observe(
+                time.perf_counter() - started
+            )
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def timed_execute(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return execute(*args, **kwargs)
+            finally:
+                REDIS_LATENCY.labels("PIPELINE").observe(time.perf_counter() - started)
+
+        pipe.execute = timed_execute
+        return pipe
+
+    connection.execute_command = timed_execute_command
+    connection.pipeline = timed_pipeline
+    return connection
+
+
+class QueueDepthCollector:
+    """Reads RQ queue lengths from Redis at scrape time (shared, not per worker)."""
+
+    def __init__(self, queues):
+        self.queues = queues
+
+    def collect(self):
+        depth = GaugeMetricFamily(
+            "rq_queue_depth", "Jobs waiting in the queue.", labels=["queue"]
+        )
+        for queue in self.queues:
+            try:
+                depth.add_metric([queue.name], queue.count)
+            except RedisError:
+                pass
+        yield depth
+
+
+def _labels():
+    rule = request.url_rule.rule if request.url_rule else "<unmatched>"
+    return request.blueprint or "", rule
+
+
+def init_metrics(app, queues=()):
+    """Record request metrics for ``app`` and serve them at ``/metrics``."""
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        g.query_count = 0
+        REQUESTS_IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_request(response):
+        if "metrics_started" not in g:
+            return response
+        blueprint, route = _labels()
+        REQUEST_LATENCY.labels(blueprint, route, request.method).observe(
+            time.perf_counter() - g.metrics_started
+        )
+        REQUESTS.labels(blueprint, route, request.method, response.status_code).inc()
+        QUERIES_PER_REQUEST.labels(blueprint, route).observe(g.query_count)
+        if not response.is_streamed and response.content_length is not None:
+            RESPONSE_SIZE.labels(blueprint, route).observe(response.content_length)
+        return response
+
+    @app.teardown_request
+    def end_request(error=None):
+        if g.pop("metrics_started", None) is not None:
+            REQUESTS_IN_FLIGHT.dec()
+
+    with app.app_context():
+        pool = db.engine.pool
+        if isinstance(pool, QueuePool):
+            POOL_SIZE.set(pool.size())
+
+    queue_depth = CollectorRegistry()
+    queue_depth.register(QueueDepthCollector(queues))
+
+    @app.route("/metrics")
+    def metrics():
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            # merge the files every worker writes its samples to
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        # queue depth is read from Redis, it is the same for every worker
+        body = generate_latest(registry) + generate_latest(queue_depth)
+        return Response(body, mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,49 @@
+"""Add full-text search index on posts
+
+Revision ID: 5b1d7c3e9a42
+Revises: 29827c21aeb4
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1d7c3e9a42'
+down_revision = '29827c21aeb4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # title matches weigh more than content matches in ts_rank
+        op.execute(
+            "ALTER TABLE posts ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'B')"
+            ") STORED"
+        )
+        op.create_index(
+            'ix_posts_search_vector', 'posts', ['search_vector'],
+            postgresql_using='gin',
+        )
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5("
+            "post_id UNINDEXED, title, content, tokenize = 'porter unicode61')"
+        )
+        op.execute(
+            "INSERT INTO posts_fts (post_id, title, content) "
+            "SELECT id, title, content FROM posts"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_posts_search_vector', table_name='posts')
+        op.drop_column('posts', 'search_vector')
+    else:
+        op.execute("DROP TABLE IF EXISTS posts_fts")
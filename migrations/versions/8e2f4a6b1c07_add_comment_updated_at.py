@@ -0,0 +1,28 @@
+"""Add updated_at to comments
+
+Revision ID: 8e2f4a6b1c07
+Revises: 5b1d7c3e9a42
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2f4a6b1c07'
+down_revision = '5b1d7c3e9a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False))
+
+    op.execute("UPDATE comments SET updated_at = created_at")
+
+
+def downgrade():
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
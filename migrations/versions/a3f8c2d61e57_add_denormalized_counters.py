@@ -0,0 +1,52 @@
+"""Add denormalized post and comment counters
+
+Revision ID: a3f8c2d61e57
+Revises: e7b3d5f09a18
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f8c2d61e57'
+down_revision = 'e7b3d5f09a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill from the existing rows
+    op.execute(
+        "UPDATE users SET post_count = "
+        "(SELECT count(*) FROM posts WHERE posts.author_id = users.id)"
+    )
+    op.execute(
+        "UPDATE categories SET post_count = "
+        "(SELECT count(*) FROM post_categories WHERE post_categories.category_id = categories.id)"
+    )
+    op.execute(
+        "UPDATE posts SET comment_count = "
+        "(SELECT count(*) FROM comments WHERE comments.post_id = posts.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.drop_column('post_count')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('post_count')
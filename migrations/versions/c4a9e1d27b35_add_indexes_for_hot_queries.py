@@ -0,0 +1,48 @@
+"""Add indexes for post, comment and login queries
+
+Revision ID: c4a9e1d27b35
+Revises: 8e2f4a6b1c07
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a9e1d27b35'
+down_revision = '8e2f4a6b1c07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.create_index('ix_posts_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_posts_author_id_created_at_id', ['author_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.create_index('ix_comments_post_id_created_at_id', ['post_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_comments_user_id', ['user_id'], unique=False)
+
+    with op.batch_alter_table('post_categories', schema=None) as batch_op:
+        batch_op.create_index('ix_post_categories_category_id_post_id', ['category_id', 'post_id'], unique=False)
+
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=False)
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_username_lower', table_name='users')
+    op.drop_index('ix_users_email_lower', table_name='users')
+
+    with op.batch_alter_table('post_categories', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_categories_category_id_post_id')
+
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_index('ix_comments_user_id')
+        batch_op.drop_index('ix_comments_post_id_created_at_id')
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_index('ix_posts_author_id_created_at_id')
+        batch_op.drop_index('ix_posts_created_at_id')
@@ -0,0 +1,49 @@
+"""Cascade user and post deletes in the database
+
+Revision ID: d62e9f1b4c83
+Revises: a3f8c2d61e57
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd62e9f1b4c83'
+down_revision = 'a3f8c2d61e57'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table); the initial migration left the foreign
+# keys unnamed, so they carry Postgres' default <table>_<column>_fkey names.
+# SQLite keeps no names at all: the naming convention gives the reflected
+# keys the same ones, so batch mode can find them when it rebuilds a table
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+FOREIGN_KEYS = (
+    ('posts', 'author_id', 'users'),
+    ('comments', 'post_id', 'posts'),
+    ('comments', 'user_id', 'users'),
+    ('post_categories', 'post_id', 'posts'),
+    ('post_categories', 'category_id', 'categories'),
+)
+
+
+def _recreate_foreign_keys(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        with op.batch_alter_table(
+            table, schema=None, naming_convention=NAMING_CONVENTION
+        ) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(
+                name, referred, [column], ['id'], ondelete=ondelete
+            )
+
+
+def upgrade():
+    _recreate_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _recreate_foreign_keys(None)
@@ -9,7 +9,12 @@ class CategoryModel(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(80), unique=True, nullable=False)
     description = db.Column(db.Text, nullable=True)
+    # kept by counters.py, repaired by `flask reconcile-counters`
+    post_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
 
     posts = db.relationship(
-        "PostModel", secondary="post_categories", back_populates="categories"
+        "PostModel",
+        secondary="post_categories",
+        back_populates="categories",
+        passive_deletes=True,
     )
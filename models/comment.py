@@ -4,14 +4,29 @@ from db import db
 
 class CommentModel(db.Model):
     __tablename__ = "comments"
+    __table_args__ = (
+        db.Index("ix_comments_post_id_created_at_id", "post_id", "created_at", "id"),
+        db.Index("ix_comments_user_id", "user_id"),
+        db.Index("ix_comments_created_at_id", "created_at", "id"),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     content = db.Column(db.Text, nullable=False)
 
-    post_id = db.Column(db.String(36), db.ForeignKey("posts.id"), nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey("users.id"), nullable=False)
+    post_id = db.Column(
+        db.String(36), db.ForeignKey("posts.id", ondelete="CASCADE"), nullable=False
+    )
+    user_id = db.Column(
+        db.String(36), db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
 
     created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(
+        db.DateTime,
+        server_default=db.func.now(),
+        onupdate=db.func.now(),
+        nullable=False,
+    )
 
     post = db.relationship("PostModel", back_populates="comments")
     user = db.relationship("UserModel", back_populates="comments")
@@ -4,12 +4,21 @@ from db import db
 
 class PostModel(db.Model):
     __tablename__ = "posts"
+    # (created_at, id) is the keyset pagination order of the post lists
+    __table_args__ = (
+        db.Index("ix_posts_created_at_id", "created_at", "id"),
+        db.Index("ix_posts_author_id_created_at_id", "author_id", "created_at", "id"),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     title = db.Column(db.String(255), nullable=False)
     content = db.Column(db.Text, nullable=False)
+    # kept by counters.py, repaired by `flask reconcile-counters`
+    comment_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
 
-    author_id = db.Column(db.String(36), db.ForeignKey("users.id"), nullable=False)
+    author_id = db.Column(
+        db.String(36), db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
     author = db.relationship("UserModel", back_populates="posts")
 
     created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
@@ -20,9 +29,16 @@ class PostModel(db.Model):
         nullable=False,
     )
 
+    # comments and category links are deleted by the database with the post
     categories = db.relationship(
-        "CategoryModel", secondary="post_categories", back_populates="posts"
+        "CategoryModel",
+        secondary="post_categories",
+        back_populates="posts",
+        passive_deletes=True,
     )
     comments = db.relationship(
-        "CommentModel", back_populates="post", cascade="all, delete"
+        "CommentModel",
+        back_populates="post",
+        cascade="all, delete",
+        passive_deletes=True,
     )
@@ -3,7 +3,16 @@ from db import db
 
 class PostCategoryModel(db.Model):
     __tablename__ = "post_categories"
-    post_id = db.Column(db.String(36), db.ForeignKey("posts.id"), primary_key=True)
+    # the primary key covers post -> categories, this covers category -> posts
+    __table_args__ = (
+        db.Index("ix_post_categories_category_id_post_id", "category_id", "post_id"),
+    )
+
+    post_id = db.Column(
+        db.String(36), db.ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True
+    )
     category_id = db.Column(
-        db.String(36), db.ForeignKey("categories.id"), primary_key=True
+        db.String(36),
+        db.ForeignKey("categories.id", ondelete="CASCADE"),
+        primary_key=True,
     )
@@ -11,6 +11,8 @@ class UserModel(db.Model):
     email = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.Text, nullable=False)
     role = db.Column(db.Integer, default=UserRole.AUTHOR.value, nullable=False)
+    # kept by counters.py, repaired by `flask reconcile-counters`
+    post_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
     updated_at = db.Column(
         db.DateTime,
@@ -19,8 +21,23 @@ class UserModel(db.Model):
         nullable=False,
     )
 
-    posts = db.relationship("PostModel", back_populates="author", cascade="all, delete")
+    # the database deletes a user's posts and comments (ON DELETE CASCADE),
+    # the ORM doesn't load them first
+    posts = db.relationship(
+        "PostModel",
+        back_populates="author",
+        cascade="all, delete",
+        passive_deletes=True,
+    )
 
     comments = db.relationship(
-        "CommentModel", back_populates="user", cascade="all, delete"
+        "CommentModel",
+        back_populates="user",
+        cascade="all, delete",
+        passive_deletes=True,
     )
+
+
+# case-insensitive login lookups: lower(email) / lower(username) = ?
+db.Index("ix_users_email_lower", db.func.lower(UserModel.email))
+db.Index("ix_users_username_lower", db.func.lower(UserModel.username))
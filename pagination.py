@@ -0,0 +1,132 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import request
+from flask_smorest import abort
+from sqlalchemy import String, cast, tuple_, type_coerce
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+# cursors are opaque to clients: base64 of [direction, sort value, id]
+def encode_cursor(direction, value, row_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([direction, value, row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return direction, value, str(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        abort(400, message="Invalid cursor.")
+
+
+def get_page_size():
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        abort(400, message="limit must be an integer.")
+    if limit < 1:
+        abort(400, message="limit must be a positive integer.")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _created_at_bound(value):
+    try:
+        datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        abort(400, message="Invalid cursor.")
+    # the value as the row stored it (see paginate); Postgres casts the
+    # literal back to a timestamp
+    return value.replace("T", " ", 1)
+
+
+def _rank_bound(value, rank):
+    if not isinstance(value, (int, float)):
+        abort(400, message="Invalid cursor.")
+    # cast to the rank's own type so a float4 rank round-trips exactly
+    return cast(value, rank.type)
+
+
+def paginate(query, model, rank=None, extras=None):
+    """Keyset pagination over (created_at, id), newest first.
+
+    Reads ``cursor`` and ``limit`` from the query string and returns a dict
+    with ``items``, ``next_cursor`` and ``prev_cursor``. When a ``rank``
+    expression is given, pages are ordered by (rank, id) best match first.
+    ``extras`` maps attribute names to expressions selected alongside each
+    row and set on the returned objects (e.g. a search snippet).
+    """
+    limit = get_page_size()
+    cursor = request.args.get("cursor")
+    sort = model.created_at if rank is None else rank
+    key = tuple_(sort, model.id)
+    extras = extras or {}
+
+    direction = None
+    if cursor:
+        direction, value, row_id = decode_cursor(cursor)
+        if rank is None:
+            bound = tuple_(_created_at_bound(value), row_id)
+        else:
+            bound = tuple_(_rank_bound(value, rank), row_id)
+        query = query.filter(key < bound if direction == "next" else key > bound)
+
+    if direction == "prev":
+        # walk backwards from the cursor, then restore best-first order
+        query = query.order_by(sort.asc(), model.id.asc())
+    else:
+        query = query.order_by(sort.desc(), model.id.desc())
+
+    labels = dict(extras)
+    if rank is not None:
+        labels["search_rank"] = rank
+    else:
+        # SQLite keeps created_at as text, with fractional seconds when the
+        # row was written from Python and without when CURRENT_TIMESTAMP
+        # filled it in. rows are sorted by that text, so the cursor carries
+        # it unparsed: a parsed and reformatted value can fall on the other
+        # side of rows from the same second, skipping or repeating them
+        labels["cursor_created_at"] = type_coerce(model.created_at, String)
+    if labels:
+        query = query.add_columns(*(expr.label(name) for name, expr in labels.items()))
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        if not labels:
+            items.append(row)
+            continue
+        item = row[0]
+        for name in labels:
+            setattr(item, name, getattr(row, name))
+        items.append(item)
+
+    if direction == "prev":
+        items.reverse()
+
+    def cursor_for(direction, item):
+        value = item.cursor_created_at if rank is None else item.search_rank
+        return encode_cursor(direction, value, item.id)
+
+    if direction == "prev":
+        next_cursor = cursor_for("next", items[-1]) if items else None
+        prev_cursor = cursor_for("prev", items[0]) if items and has_more else None
+    else:
+        next_cursor = cursor_for("next", items[-1]) if items and has_more else None
+        prev_cursor = cursor_for("prev", items[0]) if items and cursor else None
+
+    return {"items": items, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
@@ -0,0 +1,86 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """The hashing pool is saturated; the request should be retried later."""
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords in a bounded pool of worker processes.
+
+    Key stretching is deliberately slow CPU work. Running it in a separate
+    process keeps the web worker's other threads responsive, and capping the
+    number of unfinished jobs at ``max_pending`` (below the worker's thread
+    count) turns a login burst into quick 503s instead of a queue every
+    endpoint ends up waiting behind.
+    ``workers=0`` hashes in the calling thread (same cap, no pool).
+
+    ``method`` is any werkzeug method string, e.g. ``pbkdf2:sha256:600000``
+    or ``scrypt:32768:8:1``; hashes made with other parameters are reported
+    by ``needs_rehash`` so they can be upgraded at the next login.
+    """
+
+    def __init__(self, method="pbkdf2:sha256", workers=2, max_pending=8, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._current_method = None
+
+    def _get_pool(self):
+        # created lazily and again after a fork, so each gunicorn worker
+        # gets its own pool instead of sharing the master's
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        if not self.workers:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # the slot is free once the hash is done, not when we stop waiting:
+        # a timed out hash that already started keeps its process busy
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HasherBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        if self._current_method is None:
+            # werkzeug fills in default parameters, e.g. "pbkdf2:sha256" is
+            # stored as "pbkdf2:sha256:1000000"; take them from a real hash
+            self._current_method = self.hash("").split("$", 1)[0]
+        return password_hash.split("$", 1)[0] != self._current_method
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
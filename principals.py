@@ -0,0 +1,79 @@
+import json
+import logging
+
+import redis
+from flask import current_app, g
+from flask_jwt_extended import get_jwt_identity
+
+from db import db
+from enums.roles import UserRole
+from models import UserModel
+
+logger = logging.getLogger(__name__)
+
+
+class PrincipalCache:
+    """Short-lived snapshots of users for authorization checks.
+
+    Role checks used to trust the role claim baked into the token, so a role
+    change only took effect once the token expired. The snapshot is read
+    from Redis (falling back to one primary key lookup) and dropped by the
+    handlers that change a user, so every worker sees the change at once;
+    the TTL only bounds how long an entry for an idle user is kept.
+    """
+
+    KEY_PREFIX = "principal:"
+    FIELDS = ("id", "username", "email", "role")
+
+    def __init__(self, connection, ttl=60):
+        self.connection = connection
+        self.ttl = ttl
+
+    def _load(self, user_id):
+        # from the primary even in replica reads: a role change must not wait
+        # for the replicas to catch up
+        row = db.session.execute(
+            db.select(*(getattr(UserModel, field) for field in self.FIELDS)).where(
+                UserModel.id == user_id
+            ),
+            bind_arguments={"bind": db.engine},
+        ).first()
+        return dict(row._mapping) if row else None
+
+    def get(self, user_id):
+        """Return the user's snapshot dict, or None if the user is gone."""
+        key = f"{self.KEY_PREFIX}{user_id}"
+        try:
+            cached = self.connection.get(key)
+        except redis.RedisError:
+            logger.exception("Principal cache lookup failed.")
+            return self._load(user_id)
+        if cached is not None:
+            return json.loads(cached)
+
+        principal = self._load(user_id)
+        if principal is not None and self.ttl:
+            try:
+                self.connection.set(key, json.dumps(principal), ex=self.ttl)
+            except redis.RedisError:
+                logger.exception("Principal cache write failed.")
+        return principal
+
+    def invalidate(self, user_id):
+        try:
+            self.connection.delete(f"{self.KEY_PREFIX}{user_id}")
+        except redis.RedisError:
+            # can't be retried later: the stale entry lives out its TTL
+            logger.exception("Principal cache invalidation failed.")
+
+
+def current_principal():
+    """The caller's snapshot, loaded at most once per request."""
+    if "principal" not in g:
+        g.principal = current_app.principals.get(get_jwt_identity())
+    return g.principal
+
+
+def is_admin():
+    principal = current_principal()
+    return principal is not None and principal["role"] == UserRole.ADMIN.value
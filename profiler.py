@@ -0,0 +1,124 @@
+import logging
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_SAVEPOINT = "sql_profiler_explain"
+
+
+class SQLProfiler:
+    """Opt-in per-request SQL profiling.
+
+    Times every statement through engine events and, per request, counts
+    them (``X-Query-Count``/``X-DB-Time`` headers when the app runs in debug
+    mode) and warns when one statement ran more than ``n_plus_one_threshold``
+    times, the usual sign of a relationship loaded row by row. Statements
+    slower than ``slow_query_ms`` are logged with their parameters and plan;
+    on Postgres SELECTs are re-run under EXPLAIN ANALYZE if
+    ``explain_analyze`` is set, which doubles the cost of a slow query.
+    """
+
+    def __init__(self, slow_query_ms=100, n_plus_one_threshold=5, explain_analyze=True):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.explain_analyze = explain_analyze
+
+    def init_app(self, app):
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, "before_cursor_execute", self._before_execute)
+                event.listen(engine, "after_cursor_execute", self._after_execute)
+
+        @app.before_request
+        def start_profile():
+            g.sql_profile = []
+
+        @app.after_request
+        def finish_profile(response):
+            queries = g.pop("sql_profile", None)
+            if queries is None:
+                return response
+            self._check_repeats(queries)
+            if app.debug:
+                db_time = sum(duration for _, duration in queries)
+                response.headers["X-Query-Count"] = str(len(queries))
+                response.headers["X-DB-Time"] = f"{db_time * 1000:.2f}ms"
+            return response
+
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        # on the statement's own context: a statement that fails never reaches
+        # after_cursor_execute, and must leave nothing behind on the connection
+        context._profiler_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - context._profiler_started
+        if has_request_context() and "sql_profile" in g:
+            g.sql_profile.append((statement, duration))
+        if duration * 1000 >= self.slow_query_ms:
+            plan = None if executemany else self._explain(conn, statement, parameters)
+            logger.warning(
+                "Slow query (%.1fms)%s:\n%s\nparameters: %r\nplan:\n%s",
+                duration * 1000,
+                f" in {request.method} {request.path}" if has_request_context() else "",
+                statement,
+                parameters,
+                plan or "(not available)",
+            )
+
+    def _explain(self, conn, statement, parameters):
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            analyze = self.explain_analyze and statement.lstrip().upper().startswith(
+                "SELECT"
+            )
+            prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+        elif dialect == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            return None
+
+        # a raw DBAPI cursor, so the EXPLAIN itself is not profiled; on
+        # Postgres a savepoint keeps a failed EXPLAIN from aborting the
+        # request's transaction. nothing here may raise into the request
+        savepoint = dialect == "postgresql"
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+            if savepoint:
+                cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        except Exception:
+            logger.exception("Could not EXPLAIN slow query.")
+            if savepoint:
+                try:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+                except Exception:
+                    # no savepoint to go back to, e.g. the transaction had
+                    # already failed before the EXPLAIN
+                    pass
+            return None
+        finally:
+            cursor.close()
+        # Postgres returns one text column, SQLite's detail is the last one
+        return "\n".join(str(row[-1]) for row in rows)
+
+    def _check_repeats(self, queries):
+        counts = Counter(statement for statement, _ in queries)
+        for statement, count in counts.items():
+            if count > self.n_plus_one_threshold:
+                logger.warning(
+                    "Possible N+1: statement ran %d times in %s %s:\n%s",
+                    count,
+                    request.method,
+                    request.path,
+                    statement,
+                )
@@ -0,0 +1,250 @@
+import logging
+import math
+import re
+import threading
+import time
+from collections import namedtuple
+
+import redis
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+SCOPES = ("ip", "user")
+
+# ``count`` requests per ``period`` seconds, per client ip or per user
+Limit = namedtuple("Limit", "count period scope")
+# the outcome for the tightest of a request's limits
+Decision = namedtuple("Decision", "allowed limit remaining reset retry_after")
+
+_LIMIT = re.compile(r"^\s*(\d+)\s*/\s*(\w+?)s?\s+per\s+(\w+)\s*$")
+
+
+def parse_limits(spec):
+    """Parse ``"10/minute per ip, 1000/day per user"``; empty means unlimited."""
+    limits = []
+    for part in filter(str.strip, spec.split(",")):
+        match = _LIMIT.match(part)
+        if not match or match[2] not in PERIODS or match[3] not in SCOPES:
+            raise RuntimeError(f"Invalid rate limit: {part.strip()!r}.")
+        limits.append(Limit(int(match[1]), PERIODS[match[2]], match[3]))
+    return tuple(limits)
+
+
+def _decide(limits, left):
+    # left: the tokens of each bucket once this request took one, negative
+    # where there was none to take. the limit closest to running out is the
+    # one reported
+    allowed = min(left) >= 0
+    limit, tokens = min(zip(limits, left), key=lambda pair: pair[1] / pair[0].count)
+    stored = tokens if allowed else tokens + 1
+    retry_after = 0
+    if not allowed:
+        retry_after = max(
+            math.ceil(-tokens * limit.period / limit.count)
+            for limit, tokens in zip(limits, left)
+            if tokens < 0
+        )
+    return Decision(
+        allowed,
+        limit,
+        max(math.floor(tokens), 0),
+        math.ceil((limit.count - stored) * limit.period / limit.count),
+        retry_after,
+    )
+
+
+class InMemoryRateLimiter:
+    """Per-process token buckets, for tests and single-worker development."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def hit(self, keys, limits):
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, limit in zip(keys, limits):
+                tokens, updated = self._buckets.get(key, (limit.count, now))
+                refill = (now - updated) * limit.count / limit.period
+                levels.append(min(limit.count, tokens + refill))
+            allowed = all(tokens >= 1 for tokens in levels)
+            for key, tokens in zip(keys, levels):
+                self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        return _decide(limits, [tokens - 1 for tokens in levels])
+
+
+class RedisRateLimiter:
+    """Token buckets shared by all workers through Redis.
+
+    A request checks and takes a token from all of its buckets in one Lua
+    script, so a decision is a single atomic round trip. Bucket time comes
+    from the Redis clock, not the workers'.
+    """
+
+    KEY_PREFIX = "ratelimit:"
+    # KEYS: the buckets; ARGV: capacity and refill period (ms) per bucket.
+    # every bucket is a hash of its tokens and the time they were counted;
+    # the request is allowed only if all buckets have a token
+    SCRIPT = """
+    local clock = redis.call('TIME')
+    local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+    local levels = {}
+    local allowed = true
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[i * 2 - 1])
+        local period = tonumber(ARGV[i * 2])
+        local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+        local tokens = tonumber(bucket[1]) or capacity
+        local elapsed = math.max(now - (tonumber(bucket[2]) or now), 0)
+        tokens = math.min(capacity, tokens + elapsed * capacity / period)
+        levels[i] = tokens
+        if tokens < 1 then allowed = false end
+    end
+    local left = {}
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[i * 2 - 1])
+        local period = tonumber(ARGV[i * 2])
+        local tokens = levels[i]
+        if allowed then tokens = tokens - 1 end
+        redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+        redis.call('PEXPIRE', key, math.ceil((capacity - tokens) * period / capacity) + 1000)
+        left[i] = tostring(levels[i] - 1)
+    end
+    return left
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._script = connection.register_script(self.SCRIPT)
+
+    def hit(self, keys, limits):
+        args = []
+        for limit in limits:
+            args += [limit.count, limit.period * 1000]
+        try:
+            levels = self._script(
+                keys=[f"{self.KEY_PREFIX}{key}" for key in keys], args=args
+            )
+        except redis.RedisError:
+            # fail open: an outage must not take the API down with it
+            logger.exception("Rate limit check failed.")
+            return None
+        return _decide(limits, [float(tokens) for tokens in levels])
+
+
+class DisabledRateLimiter:
+    """No limits, e.g. for benchmarks."""
+
+    def hit(self, keys, limits):
+        return None
+
+
+def make_rate_limiter(backend, connection):
+    if backend == "redis":
+        return RedisRateLimiter(connection)
+    if backend == "memory":
+        return InMemoryRateLimiter()
+    if backend == "off":
+        return DisabledRateLimiter()
+    raise RuntimeError(f"Unknown rate limit backend: {backend}.")
+
+
+def _identity():
+    # signature and expiry only: jwt_required checks the token again,
+    # blocklist included, so a decision stays one Redis round trip. a request
+    # without a valid access token is only limited by ip
+    config = current_app.config
+    scheme, _, token = request.headers.get(config["JWT_HEADER_NAME"], "").partition(" ")
+    if scheme != config["JWT_HEADER_TYPE"] or not token:
+        return None
+    try:
+        claims = decode_token(token)
+    except (JWTExtendedException, PyJWTError):
+        return None
+    if claims.get("type") != "access":
+        return None
+    return claims.get(config["JWT_IDENTITY_CLAIM"])
+
+
+class RateLimits:
+    """Applies the configured limits before every request.
+
+    ``rules`` maps an endpoint (``Post.PostList``), optionally with a query
+    argument that must be present (``Post.PostList?q``), a blueprint
+    (``Users``) or ``default`` to a limit spec; the most specific matching
+    rule applies and its buckets are its own. Responses carry
+    ``RateLimit-Limit``/``-Remaining``/``-Reset`` and ``RateLimit-Policy``
+    for the tightest limit, and a 429 also ``Retry-After``.
+    """
+
+    def __init__(self, limiter, rules):
+        self.limiter = limiter
+        self.rules = {key: parse_limits(spec) for key, spec in rules.items()}
+        # endpoint -> [(query argument, rule key)] for the ?arg rules
+        self._by_argument = {}
+        for key in self.rules:
+            endpoint, _, argument = key.partition("?")
+            if argument:
+                self._by_argument.setdefault(endpoint, []).append((argument, key))
+
+    def _rule(self):
+        endpoint = request.endpoint or ""
+        for argument, key in self._by_argument.get(endpoint, ()):
+            if argument in request.args:
+                return key
+        for key in (endpoint, request.blueprint, "default"):
+            if key in self.rules:
+                return key
+        return None
+
+    def init_app(self, app):
+        @app.before_request
+        def check_rate_limit():
+            key = self._rule()
+            limits = self.rules.get(key)
+            if not limits:
+                return None
+            user_id = None
+            if any(limit.scope == "user" for limit in limits):
+                user_id = _identity()
+            applied, buckets = [], []
+            for limit in limits:
+                who = user_id if limit.scope == "user" else request.remote_addr
+                if who:
+                    applied.append(limit)
+                    buckets.append(f"{key}:{limit.scope}:{who}:{limit.period}")
+            if not applied:
+                return None
+
+            decision = self.limiter.hit(buckets, applied)
+            if decision is None:
+                return None
+            g.rate_limit = decision
+            if not decision.allowed:
+                response = jsonify(
+                    {
+                        "message": "Too many requests, slow down.",
+                        "error": "rate_limited",
+                    }
+                )
+                response.status_code = 429
+                response.headers["Retry-After"] = str(decision.retry_after)
+                return response
+            return None
+
+        @app.after_request
+        def add_rate_limit_headers(response):
+            decision = g.pop("rate_limit", None)
+            if decision is not None:
+                limit = decision.limit
+                response.headers["RateLimit-Limit"] = str(limit.count)
+                response.headers["RateLimit-Remaining"] = str(decision.remaining)
+                response.headers["RateLimit-Reset"] = str(decision.reset)
+                response.headers["RateLimit-Policy"] = f"{limit.count};w={limit.period}"
+            return response
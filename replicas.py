@@ -0,0 +1,141 @@
+import functools
+import itertools
+import logging
+import time
+
+import redis
+from flask import current_app, g, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+from db import db
+from metrics import REPLICA_READS
+
+logger = logging.getLogger(__name__)
+
+PIN_PREFIX = "primary-pin:"
+
+
+def replica_binds(urls, options):
+    """SQLALCHEMY_BINDS entries for the replica URLs, ``options(url)`` each."""
+    return {f"replica{i}": {"url": url, **options(url)} for i, url in enumerate(urls)}
+
+
+@event.listens_for(Session, "after_flush")
+def _note_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+class ReplicaRouter:
+    """Round-robin choice of a healthy read replica, with read-your-writes.
+
+    A replica that fails is left out for ``retry_seconds``, then probed with
+    ``SELECT 1`` before it gets requests again. A user whose request wrote to
+    the database is pinned to the primary for ``pin_seconds``, so they see
+    their change even while the replicas lag; pins live in Redis so every
+    worker honours them.
+    """
+
+    def __init__(self, connection, bind_keys, pin_seconds=10, retry_seconds=30):
+        self.connection = connection
+        self.bind_keys = list(bind_keys)
+        self.pin_seconds = pin_seconds
+        self.retry_seconds = retry_seconds
+        self._turns = itertools.count()
+        self._down_until = {}
+
+    def init_app(self, app):
+        @app.after_request
+        def pin_writers(response):
+            if g.pop("db_wrote", False) and response.status_code < 400:
+                try:
+                    user_id = get_jwt_identity()
+                except RuntimeError:  # the route takes no token
+                    user_id = None
+                if user_id:
+                    self.pin(user_id)
+            return response
+
+    def pin(self, user_id):
+        if not self.bind_keys or not self.pin_seconds:
+            return
+        try:
+            self.connection.set(f"{PIN_PREFIX}{user_id}", 1, ex=self.pin_seconds)
+        except redis.RedisError:
+            logger.exception("Primary pin write failed.")
+
+    def is_pinned(self, user_id):
+        try:
+            return bool(self.connection.exists(f"{PIN_PREFIX}{user_id}"))
+        except redis.RedisError:
+            # can't tell: the primary is always up to date
+            logger.exception("Primary pin lookup failed.")
+            return True
+
+    def _healthy(self, key):
+        down_until = self._down_until.get(key)
+        if down_until is None:
+            return True
+        if time.monotonic() < down_until:
+            return False
+        try:
+            with db.engines[key].connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except OperationalError:
+            self._down_until[key] = time.monotonic() + self.retry_seconds
+            return False
+        logger.warning("Read replica %s is back.", key)
+        self._down_until.pop(key, None)
+        return True
+
+    def mark_down(self, engine):
+        for key in self.bind_keys:
+            if db.engines[key] is engine:
+                logger.warning("Read replica %s failed, using the others.", key)
+                self._down_until[key] = time.monotonic() + self.retry_seconds
+
+    def choose(self, user_id=None):
+        """The engine to read from for ``user_id``, or None for the primary."""
+        if not self.bind_keys or (user_id and self.is_pinned(user_id)):
+            return None
+        start = next(self._turns)
+        for i in range(len(self.bind_keys)):
+            key = self.bind_keys[(start + i) % len(self.bind_keys)]
+            if self._healthy(key):
+                return db.engines[key]
+        return None
+
+
+def replica_reads(func):
+    """Run a read-only view against a replica.
+
+    Goes right under ``jwt_required``, so the identity is known and the
+    response is cached and serialized from the same replica. If the replica
+    fails, the view runs again on the primary.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        router = current_app.replicas
+        if not router.bind_keys:
+            return func(*args, **kwargs)
+        g.replica = router.choose(get_jwt_identity())
+        if g.replica is None:
+            REPLICA_READS.labels("primary").inc()
+            return func(*args, **kwargs)
+        try:
+            REPLICA_READS.labels("replica").inc()
+            return func(*args, **kwargs)
+        except OperationalError:
+            router.mark_down(g.replica)
+            db.session.rollback()
+            g.replica = None
+            REPLICA_READS.labels("fallback").inc()
+            return func(*args, **kwargs)
+        finally:
+            g.pop("replica", None)
+
+    return wrapper
@@ -0,0 +1,24 @@
+from flask.views import MethodView
+from flask import current_app
+from flask_smorest import Blueprint, abort
+from flask_jwt_extended import jwt_required
+from redis import RedisError
+
+from principals import is_admin
+
+blp = Blueprint("Cache", __name__, description="Response cache statistics")
+
+
+@blp.route("/cache/stats")
+class CacheStats(MethodView):
+    # hit/miss counters per cached route (admin only)
+    @jwt_required()
+    @blp.response(200)
+    def get(self):
+        if not is_admin():
+            abort(403, message="Access forbidden. Admin access required.")
+
+        try:
+            return current_app.cache.stats()
+        except RedisError:
+            abort(503, message="The cache is unavailable.")
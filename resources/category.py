@@ -1,13 +1,15 @@
-from flask import request
+from flask import current_app, request
 from flask.views import MethodView
-from enums.roles import UserRole
 from flask_smorest import Blueprint, abort
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
 from db import db
 from models import CategoryModel
 from schemas import CategorySchema
+from cache import CATEGORY_COUNTS_TAG, cached
+from principals import is_admin
+from replicas import replica_reads
 
 blp = Blueprint("Category", __name__, description="Operations on categories")
 
@@ -16,8 +18,20 @@ blp = Blueprint("Category", __name__, description="Operations on categories")
 class CategoryList(MethodView):
     # get all categories
     @jwt_required()
+    @replica_reads
+    @cached(
+        "category_list", tags=lambda categories: {"categories", CATEGORY_COUNTS_TAG}
+    )
+    @blp.etag
     @blp.response(200, CategorySchema(many=True))
     def get(self):
+        # categories are never edited, so ids and post counts identify the list
+        counts = db.session.execute(
+            db.select(CategoryModel.id, CategoryModel.post_count).order_by(
+                CategoryModel.id
+            )
+        ).all()
+        blp.set_etag([list(row) for row in counts])
         return CategoryModel.query.all()
 
     # create category
@@ -25,8 +39,7 @@ class CategoryList(MethodView):
     @blp.arguments(CategorySchema)
     @blp.response(201, CategorySchema)
     def post(self, category_data):
-        jwt = get_jwt()
-        if jwt["role"] != UserRole.ADMIN.value:
+        if not is_admin():
             abort(403, message="Access forbidden.")
 
         category = CategoryModel(**category_data)
@@ -39,6 +52,9 @@ class CategoryList(MethodView):
         except SQLAlchemyError:
             db.session.rollback()
             abort(500, message="An error occurred while creating the category.")
+
+        current_app.category_index.bump()
+        current_app.cache.invalidate("categories")
         return category
 
 
@@ -46,6 +62,11 @@ class CategoryList(MethodView):
 class CategoryItem(MethodView):
     # get category details by ID
     @jwt_required()
+    @replica_reads
+    @cached(
+        "category_detail",
+        tags=lambda category: {f"category:{category['id']}", CATEGORY_COUNTS_TAG},
+    )
     @blp.response(200, CategorySchema)
     def get(self, category_id):
         category = CategoryModel.query.get_or_404(str(category_id))
@@ -55,15 +76,23 @@ class CategoryItem(MethodView):
     @jwt_required(fresh=True)
     @blp.response(204)
     def delete(self, category_id):
-        jwt = get_jwt()
-        if jwt["role"] != UserRole.ADMIN.value:
+        if not is_admin():
             abort(403, message="Access forbidden.")
 
         category = CategoryModel.query.get_or_404(str(category_id))
+        # the category also disappears from every post that embedded it
+        stale_tags = (
+            "categories",
+            f"category:{category.id}",
+            f"category-posts:{category.name}",
+        )
         try:
             db.session.delete(category)
             db.session.commit()
         except SQLAlchemyError:
             db.session.rollback()
             abort(500, message="An error occurred while deleting the category.")
+
+        current_app.category_index.bump()
+        current_app.cache.invalidate(*stale_tags)
         return ""
@@ -1,42 +1,81 @@
-from flask import request
+from flask import current_app, request
 from flask.views import MethodView
-from enums.roles import UserRole
 from flask_smorest import Blueprint, abort
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import selectinload
 
+from cache import comment_write_tags
 from db import db
-from models import CommentModel, PostModel
-from schemas import CommentSchema
+from models import CommentModel, PostModel, UserModel
+from schemas import CommentPageSchema, CommentSchema
+from pagination import paginate
+from principals import is_admin
+from idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
+from replicas import replica_reads
 
 blp = Blueprint("Comment", __name__, description="Operations on comments")
 
 
 @blp.route("/comments")
 class AllCommentsList(MethodView):
-    # get all comments (admin only)
+    # get all comments (admin only, ?limit=20&cursor=...)
     @jwt_required()
-    @blp.response(200, CommentSchema(many=True))
+    @replica_reads
+    @blp.response(200, CommentPageSchema)
     def get(self):
-        jwt = get_jwt()
-        if jwt["role"] != UserRole.ADMIN.value:
+        if not is_admin():
             abort(403, message="Access forbidden. Admin access required.")
 
-        comments = CommentModel.query.all()
-        return comments
+        query = CommentModel.query.options(selectinload(CommentModel.user))
+        return paginate(query, CommentModel)
+
+
+def comment_etag_data(comment):
+    # the comment itself plus the commenter's username it embeds
+    return [
+        comment.id,
+        comment.updated_at.isoformat(),
+        comment.user.updated_at.isoformat(),
+    ]
+
+
+def comment_list_etag_data(post_id):
+    # one aggregate query instead of loading the comments: adding, editing or
+    # deleting a comment changes the count or moves the newest updated_at
+    count, last_updated, last_user_updated = db.session.execute(
+        db.select(
+            db.func.count(CommentModel.id),
+            db.func.max(CommentModel.updated_at),
+            db.func.max(UserModel.updated_at),
+        )
+        .join(UserModel, CommentModel.user_id == UserModel.id)
+        .where(CommentModel.post_id == post_id)
+    ).one()
+    # the page requested is part of the representation
+    page = [request.args.get("cursor"), request.args.get("limit")]
+    return [post_id, count, str(last_updated), str(last_user_updated), page]
 
 
 @blp.route("/posts/<uuid:post_id>/comments")
 class PostCommentList(MethodView):
-    # get all comments of the post
+    # get comments of the post, newest first (?limit=20&cursor=...)
     @jwt_required()
-    @blp.response(200, CommentSchema(many=True))
+    @replica_reads
+    @blp.etag
+    @blp.response(200, CommentPageSchema)
     def get(self, post_id):
         post = PostModel.query.get_or_404(str(post_id))
-        return post.comments
+        blp.set_etag(comment_list_etag_data(post.id))
+        query = CommentModel.query.options(selectinload(CommentModel.user)).filter(
+            CommentModel.post_id == post.id
+        )
+        return paginate(query, CommentModel)
 
     # create comment for the post
     @jwt_required()
+    @idempotent("create_comment")
+    @blp.doc(parameters=[IDEMPOTENCY_KEY_PARAMETER])
     @blp.arguments(CommentSchema)
     @blp.response(201, CommentSchema)
     def post(self, comment_data, post_id):
@@ -53,6 +92,9 @@ class PostCommentList(MethodView):
         except SQLAlchemyError:
             db.session.rollback()
             abort(500, message="An error occurred while creating the comment.")
+
+        # cached post pages show the post's comment_count
+        current_app.cache.invalidate(*comment_write_tags([post.id]))
         return comment
 
 
@@ -60,9 +102,12 @@ class PostCommentList(MethodView):
 class Comment(MethodView):
     # get comment details by ID
     @jwt_required()
+    @replica_reads
+    @blp.etag
     @blp.response(200, CommentSchema)
     def get(self, comment_id):
         comment = CommentModel.query.get_or_404(str(comment_id))
+        blp.set_etag(comment_etag_data(comment))
         return comment, 200
 
     # delete comment
@@ -71,20 +116,22 @@ class Comment(MethodView):
     def delete(self, comment_id):
         comment = CommentModel.query.get_or_404(str(comment_id))
         jwt_identity = get_jwt_identity()
-        jwt = get_jwt()
         #  Admin, comment owner, or post author
         if (
-            jwt["role"] != UserRole.ADMIN.value
+            not is_admin()
             and jwt_identity != comment.user_id
             and jwt_identity != comment.post.author_id
         ):
             abort(403, message="Access forbidden.")
+        post_id = comment.post_id
         try:
             db.session.delete(comment)
             db.session.commit()
         except SQLAlchemyError:
             db.session.rollback()
             abort(500, message="An error occurred while deleting the comment.")
+
+        current_app.cache.invalidate(*comment_write_tags([post_id]))
         return {"message": "Comment deleted successfully."}
 
     @jwt_required()
@@ -96,6 +143,11 @@ class Comment(MethodView):
         jwt_identity = get_jwt_identity()
         if jwt_identity != comment.user_id:
             abort(403, message="Access forbidden.")
+
+        # reject with 412 if the comment changed since the client's If-Match ETag
+        if request.if_match:
+            blp.check_etag(comment_etag_data(comment))
+
         comment.content = comment_data["content"]
         try:
             db.session.commit()
@@ -0,0 +1,38 @@
+from flask import Response, request, stream_with_context
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+from flask_jwt_extended import jwt_required
+
+from bulk_export import EXPORT_FORMATS, export_rows
+from principals import is_admin
+
+blp = Blueprint("Export", __name__, description="Streaming export of content")
+
+
+@blp.route("/export/<any(posts, comments, users):kind>")
+class Export(MethodView):
+    # stream a whole table as NDJSON or CSV (admin only, ?format=csv)
+    @jwt_required()
+    @blp.doc(
+        responses={
+            "200": {
+                "description": "One record per line",
+                "content": {mimetype: {} for mimetype in EXPORT_FORMATS.values()},
+            }
+        }
+    )
+    def get(self, kind):
+        if not is_admin():
+            abort(403, message="Access forbidden. Admin access required.")
+
+        fmt = request.args.get("format", "ndjson")
+        if fmt not in EXPORT_FORMATS:
+            abort(400, message=f"format must be one of: {', '.join(EXPORT_FORMATS)}.")
+
+        # the body is generated while it is sent, with the request context
+        # (and its database session) kept open until the last chunk
+        return Response(
+            stream_with_context(export_rows(kind, request.args, fmt)),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={"Content-Disposition": f"attachment; filename={kind}.{fmt}"},
+        )
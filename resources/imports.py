@@ -0,0 +1,38 @@
+from flask import request
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+from flask_jwt_extended import jwt_required
+
+from bulk_import import DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE, import_ndjson
+from principals import is_admin
+from schemas import ImportReportSchema
+
+blp = Blueprint("Import", __name__, description="Bulk import of content")
+
+
+@blp.route("/import")
+class BulkImport(MethodView):
+    # stream NDJSON categories/posts/comments into the database (admin only)
+    @jwt_required(fresh=True)
+    @blp.doc(
+        requestBody={
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        },
+        parameters=[
+            {"in": "query", "name": "chunk_size", "schema": {"type": "integer"}}
+        ],
+    )
+    @blp.response(200, ImportReportSchema)
+    def post(self):
+        if not is_admin():
+            abort(403, message="Access forbidden. Admin access required.")
+
+        chunk_size = request.args.get("chunk_size", DEFAULT_CHUNK_SIZE, type=int)
+        if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+            abort(400, message=f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}.")
+
+        # request.stream is read line by line, the body is never buffered
+        return import_ndjson(request.stream, chunk_size)
@@ -0,0 +1,33 @@
+from flask.views import MethodView
+from flask import current_app
+from flask_smorest import Blueprint, abort
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+
+from principals import is_admin
+from schemas import JobSchema
+
+blp = Blueprint("Job", __name__, description="Progress of background jobs")
+
+
+@blp.route("/jobs/<string:job_id>")
+class JobStatus(MethodView):
+    # status of a background deletion, for whoever asked for it or an admin
+    @jwt_required()
+    @blp.response(200, JobSchema)
+    def get(self, job_id):
+        queue = current_app.maintenance_queue
+        try:
+            job = Job.fetch(job_id, connection=queue.connection)
+        except NoSuchJobError:
+            abort(404, message="Job not found.")
+
+        if job.meta.get("requested_by") != get_jwt_identity() and not is_admin():
+            abort(403, message="Access forbidden.")
+
+        return {
+            "id": job.id,
+            "status": job.get_status().value,
+            "progress": job.meta.get("progress"),
+        }
@@ -1,62 +1,170 @@
 import uuid
-from flask import request
+from flask import current_app, g, request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from db import db
 from models import PostModel, CategoryModel
-from schemas import PostResponseSchema, PostSchema
-from enums.roles import UserRole
+from schemas import JobQueuedSchema, PostPageSchema, PostResponseSchema, PostSchema
+from pagination import paginate
+from cache import cached, post_page_tags, post_tags, post_write_tags
+from principals import is_admin
+from idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
+from replicas import replica_reads
+from deletions import delete_post_job, enqueue_deletion, post_deletion_size
+from sqlalchemy.orm import joinedload, load_only, selectinload
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
 blp = Blueprint("Post", __name__, description="Operations on posts")
 
+# relationships nested by PostResponseSchema, loaded up front so serializing
+# a page costs a fixed number of queries instead of two per post.
+# lists use selectin (one IN query per relationship, safe with LIMIT),
+# a single post joins its author into the same row.
+POST_LIST_LOADERS = (
+    selectinload(PostModel.author),
+    selectinload(PostModel.categories),
+)
+POST_DETAIL_LOADERS = (
+    joinedload(PostModel.author),
+    selectinload(PostModel.categories),
+)
+
+
+# ?excerpt=N bounds, and the length used when ?fields= asks for an excerpt
+# without giving one
+MAX_EXCERPT_LENGTH = 5000
+DEFAULT_EXCERPT_LENGTH = 200
+# fields a list item can be limited to with ?fields=, and the columns each
+# one needs besides id and created_at, which the cursor is built from
+POST_LIST_FIELDS = {
+    "id": (),
+    "title": (PostModel.title,),
+    "content": (PostModel.content,),
+    "excerpt": (),
+    "author": (PostModel.author_id,),
+    "categories": (),
+    "created_at": (),
+    "updated_at": (PostModel.updated_at,),
+    "comment_count": (PostModel.comment_count,),
+    "snippet": (),
+}
+
+
+def _excerpt_length(args):
+    length = args.get("excerpt")
+    if length is None:
+        return None
+    try:
+        length = int(length)
+    except ValueError:
+        abort(400, message="excerpt must be an integer.")
+    if not 1 <= length <= MAX_EXCERPT_LENGTH:
+        abort(400, message=f"excerpt must be between 1 and {MAX_EXCERPT_LENGTH}.")
+    return length
+
+
+def select_post_fields(query, args, author_loader=POST_LIST_LOADERS[0]):
+    """Apply ``?fields=`` and ``?excerpt=`` to a post list query.
+
+    Only the columns and relationships of the requested fields are loaded;
+    an excerpt is cut by the database, so ``content`` is never read unless
+    it is asked for. Returns the query, the set of fields to show and the
+    extra expressions to select through ``paginate``. The fieldset is kept
+    in ``g.fieldset`` for ``PostPageSchema``.
+    """
+    requested = args.get("fields")
+    excerpt = _excerpt_length(args)
+    if requested:
+        fields = set(filter(None, (name.strip() for name in requested.split(","))))
+        unknown = fields - POST_LIST_FIELDS.keys()
+        if unknown:
+            abort(400, message=f"Unknown fields: {', '.join(sorted(unknown))}.")
+        if excerpt:
+            fields.add("excerpt")
+    else:
+        fields = set(POST_LIST_FIELDS)
+        # an excerpt replaces the full content
+        fields.discard("content" if excerpt else "excerpt")
+
+    extras = {}
+    if "excerpt" in fields:
+        length = excerpt or DEFAULT_EXCERPT_LENGTH
+        extras["excerpt"] = db.func.substr(PostModel.content, 1, length)
+
+    sparse = bool(requested or excerpt)
+    options = []
+    if sparse:
+        columns = {PostModel.id, PostModel.created_at}
+        columns.update(*(POST_LIST_FIELDS[name] for name in fields))
+        options.append(load_only(*columns))
+    if "author" in fields and author_loader is not None:
+        options.append(author_loader)
+    if "categories" in fields:
+        options.append(selectinload(PostModel.categories))
+
+    g.fieldset = tuple(sorted(fields)) if sparse else None
+    return query.options(*options), fields, extras
+
+
+def filter_posts(query, args):
+    # Filter by category name (?category=python&category=flask)
+    category_names = args.getlist("category")
+    if category_names:
+        query = query.filter(
+            PostModel.categories.any(CategoryModel.name.in_(category_names))
+        )
+
+    # Filter by author_id (?author_id=some-uuid)
+    author_id = args.get("author_id")
+    if author_id:
+        query = query.filter(PostModel.author_id == author_id)
+
+    # filter by creation date (?created_after=2023-01-01&created_before=2023-12-31)
+    if args.get("created_after"):
+        query = query.filter(PostModel.created_at > args.get("created_after"))
+
+    if args.get("created_before"):
+        query = query.filter(PostModel.created_at < args.get("created_before"))
+
+    return query
+
+
+def post_etag_data(post):
+    # everything PostResponseSchema renders that can change, without dumping it
+    return [
+        post.id,
+        post.updated_at.isoformat(),
+        post.comment_count,
+        post.author.updated_at.isoformat(),
+        sorted(category.id for category in post.categories),
+    ]
+
 
 @blp.route("/posts")
 class PostList(MethodView):
     @jwt_required()
-    @blp.response(200, PostResponseSchema(many=True))
-    def get(self):  # list posts with filters
-        query = PostModel.query
-
-        # Filter by category name (?category=python&category=flask)
-        category_names = request.args.getlist("category")
-        if category_names:
-            query = query.join(PostModel.categories).filter(
-                CategoryModel.name.in_(category_names)
-            )
-
-        # Filter by author_id (?author_id=some-uuid)
-        author_id = request.args.get("author_id")
-        if author_id:
-            query = query.filter(PostModel.author_id == author_id)
-
-        # Search by title or content (?search=flask)
-        search = request.args.get("q")
+    @replica_reads
+    @cached("post_list", tags=post_page_tags)
+    @blp.response(200, PostPageSchema)
+    def get(self):  # list posts with filters (?limit=20&cursor=...)
+        # only the fields asked for (?fields=id,title&excerpt=200)
+        query, fields, extras = select_post_fields(PostModel.query, request.args)
+        query = filter_posts(query, request.args)
+
+        # full-text search ranked by relevance (?q=flask)
+        search = request.args.get("q", "").strip()
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    PostModel.title.ilike(search_term),
-                    PostModel.content.ilike(search_term),
-                )
-            )
-
-        # filter by creation date (?created_after=2023-01-01&created_before=2023-12-31)
-        if request.args.get("created_after"):
-            query = query.filter(
-                PostModel.created_at > request.args.get("created_after")
-            )
-
-        if request.args.get("created_before"):
-            query = query.filter(
-                PostModel.created_at < request.args.get("created_before")
-            )
-
-        return query.all()
+            query, rank, snippet = current_app.search.search(query, search)
+            if "snippet" in fields:
+                extras["snippet"] = snippet
+            return paginate(query, PostModel, rank=rank, extras=extras)
+        return paginate(query, PostModel, extras=extras)
 
     @jwt_required(fresh=True)
+    @idempotent("create_post")
+    @blp.doc(parameters=[IDEMPOTENCY_KEY_PARAMETER])
     @blp.arguments(PostSchema)
     @blp.response(201, PostResponseSchema)
     def post(self, post_data):  # create post
@@ -64,11 +172,9 @@ class PostList(MethodView):
         post = PostModel(**post_data)
 
         if category_names:
-            categories = CategoryModel.query.filter(
-                CategoryModel.name.in_(category_names)
-            ).all()
+            categories = current_app.category_index.resolve(category_names)
 
-            if len(categories) != len(category_names):
+            if categories is None:
                 abort(404, message="One or more categories not found.")
 
             post.categories = categories
@@ -77,11 +183,15 @@ class PostList(MethodView):
 
         try:
             db.session.add(post)
+            db.session.flush()
+            current_app.search.index_post(post)
             db.session.commit()
         except SQLAlchemyError:
             db.session.rollback()
             abort(500, message="An error occurred while creating the post.")
 
+        current_app.cache.invalidate(*post_write_tags(post, category_names))
+
         return post, 201
 
 
@@ -89,9 +199,14 @@ class PostList(MethodView):
 class Post(MethodView):
     # get post details by ID
     @jwt_required()
+    @replica_reads
+    @cached("post_detail", tags=post_tags)
+    @blp.etag
     @blp.response(200, PostResponseSchema)
     def get(self, post_id):  # get individual post details
-        post = PostModel.query.get_or_404(str(post_id))
+        post = PostModel.query.options(*POST_DETAIL_LOADERS).get_or_404(str(post_id))
+        # answers If-None-Match with a 304 before the post is serialized
+        blp.set_etag(post_etag_data(post))
         return post, 200
 
     @jwt_required(fresh=True)
@@ -109,16 +224,22 @@ class Post(MethodView):
                 403,
                 message="Access forbidden. Only the author can update this post.",
             )
+
+        # optional optimistic locking: reject the update with 412 if the post
+        # changed since the client read the ETag it sends in If-Match
+        if request.if_match:
+            blp.check_etag(post_etag_data(post))
+        # pages filtered by the old or new categories are affected
+        affected_categories = {category.name for category in post.categories}
+
         # update categories only if the field is provided in request
         if "category_names" in post_data:
             category_names = post_data.pop("category_names")
 
             if category_names:  # if category_names is not empty
-                categories = CategoryModel.query.filter(
-                    CategoryModel.name.in_(category_names)
-                ).all()
+                categories = current_app.category_index.resolve(category_names)
 
-                if len(categories) != len(category_names):
+                if categories is None:
                     abort(404, message="One or more categories not found.")
 
                 post.categories = categories
@@ -130,33 +251,52 @@ class Post(MethodView):
         for key, value in post_data.items():
             setattr(post, key, value)
 
+        affected_categories.update(category.name for category in post.categories)
+        stale_tags = post_write_tags(post, affected_categories)
+
         try:
+            current_app.search.index_post(post)
             db.session.commit()
         except SQLAlchemyError:
             db.session.rollback()
             abort(500, message="An error occurred while updating the post.")
 
+        current_app.cache.invalidate(*stale_tags)
+
         return {"message": "Post updated successfully."}
 
     @jwt_required(fresh=True)
     @blp.response(204)
+    @blp.alt_response(202, schema=JobQueuedSchema)
     def delete(self, post_id):  # delete post
         post = PostModel.query.get_or_404(str(post_id))
 
         # Check authorization - only author or admin can delete
         jwt_identity = get_jwt_identity()
-        jwt = get_jwt()
 
-        if post.author_id != jwt_identity and jwt["role"] != UserRole.ADMIN.value:
+        if post.author_id != jwt_identity and not is_admin():
             abort(
                 403,
                 message="Access forbidden. Only the author or admin can delete this post.",
             )
 
+        # posts with many comments are deleted by a worker, a chunk at a time
+        if post_deletion_size(post) > current_app.config["DELETE_IN_BACKGROUND_ABOVE"]:
+            job = enqueue_deletion(delete_post_job, post.id, jwt_identity)
+            return {"message": "Post deletion started.", "job_id": job.id}, 202
+
+        stale_tags = post_write_tags(
+            post, [category.name for category in post.categories]
+        )
         try:
+            current_app.search.remove_post(post.id)
+            # the database deletes the comments (ON DELETE CASCADE)
             db.session.delete(post)
             db.session.commit()
         except SQLAlchemyError:
+            db.session.rollback()
             abort(500, message="An error occurred while deleting the post.")
 
+        current_app.cache.invalidate(*stale_tags)
+
         return {"message": "Post deleted successfully"}, 204
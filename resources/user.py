@@ -5,8 +5,7 @@ from flask import request, render_template, current_app
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import or_, and_
+from sqlalchemy import and_, case, or_
 from jwt import ExpiredSignatureError, InvalidTokenError
 from flask_jwt_extended import (
     create_access_token,
@@ -19,7 +18,7 @@ from flask_jwt_extended import (
 
 
 from db import db
-from models import UserModel
+from models import PostModel, UserModel
 from schemas import (
     ResetPasswordSchema,
     UserSchema,
@@ -28,11 +27,22 @@ from schemas import (
     UpdateProfileSchema,
     ChangePasswordSchema,
     ChangeRoleSchema,
-    PostResponseSchema,
+    PostPageSchema,
+    JobQueuedSchema,
 )
-from enums.roles import UserRole
-from blocklist import BLOCKLIST
-from tasks import send_user_registration_email
+from deletions import (
+    delete_user_job,
+    enqueue_deletion,
+    user_deletion_size,
+    user_stale_tags,
+)
+from pagination import paginate
+from passwords import HasherBusy
+from principals import is_admin
+from idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
+from replicas import replica_reads
+from resources.post import select_post_fields
+from tasks import email_retry, send_user_registration_email
 
 blp = Blueprint("Users", __name__, description="Operations on users")
 
@@ -40,15 +50,17 @@ blp = Blueprint("Users", __name__, description="Operations on users")
 # registration
 @blp.route("/register")
 class UserRegister(MethodView):
+    # a retried registration gets its first answer back instead of a 409
+    # and a second welcome email
+    @idempotent("register")
+    @blp.doc(parameters=[IDEMPOTENCY_KEY_PARAMETER])
     @blp.arguments(UserSignupSchema)
     def post(self, user_data):
 
         user = UserModel(
             username=user_data["username"].lower(),
             email=user_data["email"].lower(),
-            password_hash=generate_password_hash(
-                user_data["password"], method="pbkdf2:sha256", salt_length=16
-            ),
+            password_hash=current_app.password_hasher.hash(user_data["password"]),
         )
         try:
             db.session.add(user)
@@ -59,11 +71,17 @@ class UserRegister(MethodView):
         except SQLAlchemyError:
             db.session.rollback()
             abort(500, message="An error occurred while registering the user.")
+        # the request has no token for pin_writers to pin: keep the new user
+        # on the primary until the replicas have their row
+        current_app.replicas.pin(user.id)
 
         # send email to the user
         try:
             current_app.queue.enqueue(
-                send_user_registration_email, user.email, user.username
+                send_user_registration_email,
+                user.email,
+                user.username,
+                retry=email_retry(),
             )
             return {
                 "message": "User created successfully. Please check your email for details."
@@ -80,15 +98,29 @@ class UserRegister(MethodView):
 class UserLogin(MethodView):
     @blp.arguments(UserLoginSchema)
     def post(self, user_data):
-        # check email first
-        username_email = user_data["username_email"]
-        user = UserModel.query.filter_by(email=username_email).first()
+        # email or username in one query (case-insensitive, both served by the
+        # lower() indexes); an email match wins over a username match
+        username_email = user_data["username_email"].lower()
+        email_match = db.func.lower(UserModel.email) == username_email
+        user = (
+            UserModel.query.filter(
+                or_(email_match, db.func.lower(UserModel.username) == username_email)
+            )
+            .order_by(case((email_match, 0), else_=1))
+            .first()
+        )
 
-        if not user:
-            # if not email check username
-            user = UserModel.query.filter_by(username=username_email).first()
+        hasher = current_app.password_hasher
+        if user and hasher.verify(user.password_hash, user_data["password"]):
+            # upgrade hashes made with an older algorithm or cost; the login
+            # succeeds either way, so a failed upgrade is retried next time
+            try:
+                if hasher.needs_rehash(user.password_hash):
+                    user.password_hash = hasher.hash(user_data["password"])
+                    db.session.commit()
+            except (HasherBusy, SQLAlchemyError):
+                db.session.rollback()
 
-        if user and check_password_hash(user.password_hash, user_data["password"]):
             access_token = create_access_token(
                 identity=str(user.id), additional_claims={"role": user.role}, fresh=True
             )
@@ -117,8 +149,8 @@ class UserRefresh(MethodView):
 class UserLogout(MethodView):
     @jwt_required()
     def post(self):
-        jti = get_jwt()["jti"]
-        BLOCKLIST.add(jti)
+        jwt = get_jwt()
+        current_app.blocklist.revoke(jwt["jti"], jwt["exp"])
         return {"message": "Successfully logged out."}, 200
 
 
@@ -126,10 +158,10 @@ class UserLogout(MethodView):
 @blp.route("/users")
 class UserList(MethodView):
     @jwt_required()
+    @replica_reads
     @blp.response(200, UserSchema(many=True))
     def get(self):
-        jwt = get_jwt()
-        if jwt["role"] != UserRole.ADMIN.value:
+        if not is_admin():
             abort(403, message="Access forbidden.")
         return UserModel.query.all()
 
@@ -138,13 +170,13 @@ class UserList(MethodView):
 class UserProfile(MethodView):
     # get user details / profile
     @jwt_required()
+    @replica_reads
     @blp.response(200, UserSchema)
     def get(self, user_id):
 
         jwt_identity = get_jwt_identity()
-        jwt = get_jwt()
 
-        if jwt["role"] != UserRole.ADMIN.value and str(user_id) != jwt_identity:
+        if not is_admin() and str(user_id) != jwt_identity:
             abort(403, message="Access forbidden.")
 
         user = UserModel.query.get_or_404(str(user_id))
@@ -190,24 +222,40 @@ class UserProfile(MethodView):
             db.session.rollback()
             abort(500, message=str(e))
 
+        current_app.principals.invalidate(str(user_id))
+        # posts embed the author's username
+        current_app.cache.invalidate(f"author:{user_id}")
         return {"message": "Profile updated successfully."}
 
-    # delete user
+    # delete user, with their posts and comments
     @jwt_required(fresh=True)
     @blp.response(204)
+    @blp.alt_response(202, schema=JobQueuedSchema)
     def delete(self, user_id):
         jwt_identity = get_jwt_identity()
-        jwt = get_jwt()
 
-        if jwt_identity != str(user_id) and jwt["role"] != UserRole.ADMIN.value:
+        if jwt_identity != str(user_id) and not is_admin():
             abort(403, message="Access forbidden.")
 
         user = UserModel.query.get_or_404(str(user_id))
+
+        # large accounts are deleted by a worker, a chunk at a time
+        if user_deletion_size(user) > current_app.config["DELETE_IN_BACKGROUND_ABOVE"]:
+            job = enqueue_deletion(delete_user_job, user.id, jwt_identity)
+            return {"message": "User deletion started.", "job_id": job.id}, 202
+
+        stale_tags = user_stale_tags(user.id)
         try:
+            current_app.search.remove_author_posts(user.id)
+            # the database deletes the posts and comments (ON DELETE CASCADE)
             db.session.delete(user)
             db.session.commit()
         except SQLAlchemyError:
+            db.session.rollback()
             abort(500, message="An error occurred while deleting the user.")
+
+        current_app.principals.invalidate(str(user_id))
+        current_app.cache.invalidate(*stale_tags)
         return {"message": "User deleted successfully"}
 
 
@@ -222,18 +270,18 @@ class UserPasswordChange(MethodView):
 
         user = UserModel.query.get_or_404(user_id)
         # error if the password is wrong
-        if not check_password_hash(user.password_hash, password_data["old_password"]):
+        hasher = current_app.password_hasher
+        if not hasher.verify(user.password_hash, password_data["old_password"]):
             abort(401, message="Invalid old password.")
 
-        user.password_hash = generate_password_hash(
-            password_data["new_password"], method="pbkdf2:sha256", salt_length=16
-        )
+        user.password_hash = hasher.hash(password_data["new_password"])
         try:
             db.session.commit()
         except SQLAlchemyError:
             db.session.rollback()
             abort(500, message="An error occurred while changing the password.")
 
+        current_app.principals.invalidate(user_id)
         return {"message": "Password changed successfully."}, 200
 
 
@@ -244,8 +292,7 @@ class UserRoleChange(MethodView):
     @blp.arguments(ChangeRoleSchema)
     @blp.response(200)
     def patch(self, role_data, user_id):
-        jwt = get_jwt()
-        if jwt["role"] != UserRole.ADMIN.value:
+        if not is_admin():
             abort(403, message="Access forbidden.")
 
         user = UserModel.query.get_or_404(str(user_id))
@@ -256,6 +303,9 @@ class UserRoleChange(MethodView):
             db.session.rollback()
             abort(500, message="An error occurred while updating the user role.")
 
+        # takes effect on the user's existing tokens too
+        current_app.principals.invalidate(str(user_id))
+
         return {"message": "User role updated successfully."}
 
 
@@ -263,10 +313,7 @@ class UserRoleChange(MethodView):
 class AdminResetPassword(MethodView):
     @jwt_required()
     def post(self, user_id):
-        current_user_id = get_jwt_identity()
-        admin = UserModel.query.get_or_404(current_user_id)
-
-        if admin.role != 1:
+        if not is_admin():
             abort(403, message="Access forbidden. Admins only.")
 
         # Ensure the user exists
@@ -314,8 +361,8 @@ class UserSetNewPassword(MethodView):
         user = UserModel.query.get_or_404(user_id)
 
         # Update password
-        user.password_hash = generate_password_hash(
-            password_data["new_password"], method="pbkdf2:sha256", salt_length=16
+        user.password_hash = current_app.password_hasher.hash(
+            password_data["new_password"]
         )
         try:
             db.session.commit()
@@ -323,6 +370,7 @@ class UserSetNewPassword(MethodView):
             db.session.rollback()
             abort(500, message="An error occurred while changing the password.")
 
+        current_app.principals.invalidate(user_id)
         return {"message": "Password resetted successfully."}, 200
 
 
@@ -330,7 +378,14 @@ class UserSetNewPassword(MethodView):
 @blp.route("/users/<uuid:user_id>/posts")
 class UserPosts(MethodView):
     @jwt_required()
-    @blp.response(200, PostResponseSchema(many=True))
+    @replica_reads
+    @blp.response(200, PostPageSchema)
     def get(self, user_id):
         user = UserModel.query.get_or_404(str(user_id))
-        return user.posts
+        # the author is already in the session, so only categories need loading
+        query, _, extras = select_post_fields(
+            PostModel.query, request.args, author_loader=None
+        )
+        return paginate(
+            query.filter(PostModel.author_id == user.id), PostModel, extras=extras
+        )
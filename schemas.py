@@ -1,5 +1,8 @@
 from marshmallow import Schema, fields, validate
 from datetime import datetime
+import uuid
+
+from serializers import CompiledDumpMixin, SparseNested
 
 
 # user schemas
@@ -8,6 +11,7 @@ class UserSchema(Schema):  # for get users details
     username = fields.Str(required=True)
     email = fields.Email(required=True)
     role = fields.Int(dump_only=True)
+    post_count = fields.Int(dump_only=True)
     created_at = fields.DateTime(dump_only=True)
     updated_at = fields.DateTime(dump_only=True)
 
@@ -62,14 +66,18 @@ class ChangeRoleSchema(Schema):
     role = fields.Int(required=True, validate=lambda x: x in [1, 2])
 
 
+# the schemas of high-volume responses dump through generated functions
+# (see serializers.py), with the same output as marshmallow's
+
+
 # user mini schema for nested representation in posts and comments
-class UserMiniSchema(Schema):
+class UserMiniSchema(CompiledDumpMixin, Schema):
     id = fields.Str()
     username = fields.Str()
 
 
 # comment schema
-class CommentSchema(Schema):
+class CommentSchema(CompiledDumpMixin, Schema):
     id = fields.Str(dump_only=True)
     content = fields.Str(required=True, validate=validate.Length(min=2))
     user = fields.Nested(UserMiniSchema, dump_only=True)
@@ -78,9 +86,17 @@ class CommentSchema(Schema):
 
 
 # category schema
-class CategorySchema(Schema):
+class CategorySchema(CompiledDumpMixin, Schema):
     id = fields.Str(dump_only=True)
     name = fields.Str(required=True)
+    post_count = fields.Int(dump_only=True)
+
+
+# category mini schema for posts: without post_count, so cached posts don't
+# go stale as their categories grow
+class CategoryMiniSchema(CompiledDumpMixin, Schema):
+    id = fields.Str()
+    name = fields.Str()
 
 
 # post schemas
@@ -91,11 +107,72 @@ class PostSchema(Schema):
     category_names = fields.List(fields.Str(), required=False)
 
 
-class PostResponseSchema(PostSchema):  # post details
+class PostResponseSchema(CompiledDumpMixin, PostSchema):  # post details
     id = fields.Str()
     title = fields.Str()
     content = fields.Str()
     author = fields.Nested(UserMiniSchema, dump_only=True)
     created_at = fields.DateTime()
     updated_at = fields.DateTime()
-    categories = fields.List(fields.Nested(CategorySchema))
+    categories = fields.List(fields.Nested(CategoryMiniSchema))
+    snippet = fields.Str(dump_only=True)  # highlighted match, only with ?q=
+    excerpt = fields.Str(dump_only=True)  # start of content, only with ?excerpt=
+    comment_count = fields.Int(dump_only=True)
+
+
+# cursor paginated post list
+class PostPageSchema(CompiledDumpMixin, Schema):
+    items = SparseNested(PostResponseSchema, many=True)
+    next_cursor = fields.Str(allow_none=True)
+    prev_cursor = fields.Str(allow_none=True)
+
+
+# cursor paginated comment list
+class CommentPageSchema(CompiledDumpMixin, Schema):
+    items = fields.List(fields.Nested(CommentSchema))
+    next_cursor = fields.Str(allow_none=True)
+    prev_cursor = fields.Str(allow_none=True)
+
+
+# bulk import schemas: the API schemas plus the fields a migration has to set
+class CategoryImportSchema(CategorySchema):
+    id = fields.UUID(load_default=uuid.uuid4)
+    description = fields.Str()
+
+
+class PostImportSchema(PostSchema):
+    id = fields.UUID(load_default=uuid.uuid4)
+    author_id = fields.UUID(required=True)
+    created_at = fields.DateTime()
+
+
+class CommentImportSchema(CommentSchema):
+    id = fields.UUID(load_default=uuid.uuid4)
+    post_id = fields.UUID(required=True)
+    user_id = fields.UUID(required=True)
+    created_at = fields.DateTime()
+
+
+class ImportErrorSchema(Schema):
+    line = fields.Int()
+    errors = fields.Raw()
+
+
+class ImportReportSchema(Schema):
+    imported = fields.Dict(keys=fields.Str(), values=fields.Int())
+    failed = fields.Int()
+    errors = fields.List(fields.Nested(ImportErrorSchema))
+    errors_truncated = fields.Bool()
+
+
+# background deletions (DELETE /users/<id>, DELETE /posts/<id> above the size
+# threshold) answer 202 with a job, polled at /jobs/<id>
+class JobQueuedSchema(Schema):
+    message = fields.Str()
+    job_id = fields.Str()
+
+
+class JobSchema(Schema):
+    id = fields.Str()
+    status = fields.Str()
+    progress = fields.Dict(keys=fields.Str(), values=fields.Int(), allow_none=True)
@@ -0,0 +1,163 @@
+from sqlalchemy import Float, column, func, literal_column, table, text
+from sqlalchemy.dialects.postgresql import REAL, TSVECTOR
+from sqlalchemy.engine import make_url
+
+from db import db
+from models import PostModel
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+SNIPPET_WORDS = 30
+
+
+class PostgresSearch:
+    """Ranked search over the ``posts.search_vector`` tsvector column.
+
+    The column is generated from title and content by the database (see the
+    full-text search migration), so writes need no extra work here.
+    """
+
+    search_vector = literal_column("posts.search_vector", type_=TSVECTOR)
+
+    def search(self, query, term):
+        tsquery = func.websearch_to_tsquery("english", term)
+        rank = func.ts_rank_cd(self.search_vector, tsquery, type_=REAL)
+        snippet = func.ts_headline(
+            "english",
+            PostModel.content,
+            tsquery,
+            f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, "
+            f"MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}",
+        )
+        return query.filter(self.search_vector.op("@@")(tsquery)), rank, snippet
+
+    def index_post(self, post):
+        pass
+
+    def index_new_posts(self, rows):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def rebuild_index(self):
+        pass
+
+    def remove_author_posts(self, author_id):
+        pass
+
+
+class SQLiteSearch:
+    """Ranked search through an FTS5 table kept in sync by the write handlers."""
+
+    fts = table("posts_fts", column("post_id"), column("title"), column("content"))
+
+    def __init__(self):
+        self._ready = False
+
+    def ensure_index(self):
+        """Create and backfill the FTS table if it is missing.
+
+        Runs inside the current transaction so a write that fails also undoes
+        the table; returns True when the caller has to commit it.
+        """
+        if self._ready:
+            return False
+        exists = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'")
+        ).first()
+        if exists:
+            self._ready = True
+            return False
+        db.session.execute(
+            text(
+                "CREATE VIRTUAL TABLE posts_fts USING fts5("
+                "post_id UNINDEXED, title, content, tokenize = 'porter unicode61')"
+            )
+        )
+        # index posts written before the table existed
+        db.session.execute(
+            text(
+                "INSERT INTO posts_fts (post_id, title, content) "
+                "SELECT id, title, content FROM posts"
+            )
+        )
+        return True
+
+    @staticmethod
+    def _match_expression(term):
+        # quote every word so user input can't inject FTS5 query syntax
+        words = term.split()
+        return " ".join('"' + word.replace('"', '""') + '"' for word in words)
+
+    def search(self, query, term):
+        if self.ensure_index():
+            db.session.commit()
+        # bm25 is lower-is-better; negate it so rank sorts like ts_rank
+        rank = -func.bm25(literal_column("posts_fts"), 0.0, 10.0, 1.0, type_=Float)
+        snippet = func.snippet(
+            literal_column("posts_fts"),
+            2,
+            HIGHLIGHT_START,
+            HIGHLIGHT_STOP,
+            "…",
+            SNIPPET_WORDS,
+        )
+        query = query.join(self.fts, self.fts.c.post_id == PostModel.id).filter(
+            literal_column("posts_fts").op("MATCH")(self._match_expression(term))
+        )
+        return query, rank, snippet
+
+    def index_post(self, post):
+        self.ensure_index()
+        self.remove_post(post.id)
+        db.session.execute(
+            self.fts.insert().values(
+                post_id=post.id, title=post.title, content=post.content
+            )
+        )
+
+    def index_new_posts(self, rows):
+        # bulk variant for freshly inserted posts: rows of id/title/content
+        self.ensure_index()
+        db.session.execute(
+            self.fts.insert(),
+            [
+                {"post_id": row["id"], "title": row["title"], "content": row["content"]}
+                for row in rows
+            ],
+        )
+
+    def remove_post(self, post_id):
+        self.ensure_index()
+        db.session.execute(self.fts.delete().where(self.fts.c.post_id == post_id))
+
+    def rebuild_index(self):
+        # for posts written around the app, e.g. by the seeder
+        if not self.ensure_index():
+            db.session.execute(self.fts.delete())
+            db.session.execute(
+                text(
+                    "INSERT INTO posts_fts (post_id, title, content) "
+                    "SELECT id, title, content FROM posts"
+                )
+            )
+
+    def remove_author_posts(self, author_id):
+        self.ensure_index()
+        db.session.execute(
+            self.fts.delete().where(
+                self.fts.c.post_id.in_(
+                    db.select(PostModel.id).where(PostModel.author_id == author_id)
+                )
+            )
+        )
+
+
+def make_search_backend(database_url):
+    backend = make_url(database_url).get_backend_name()
+    if backend == "postgresql":
+        return PostgresSearch()
+    if backend == "sqlite":
+        return SQLiteSearch()
+    raise RuntimeError(f"Full-text search is not supported on {backend}.")
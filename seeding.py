@@ -0,0 +1,270 @@
+import csv
+import io
+import math
+import multiprocessing
+import random
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import accumulate
+
+from flask import current_app
+from sqlalchemy import create_engine, insert
+
+from counters import COUNTERS, reconcile
+from db import db
+from enums.roles import UserRole
+from models import CategoryModel, CommentModel, PostCategoryModel, PostModel, UserModel
+
+# every seeded user logs in with this password
+SEED_PASSWORD = "seed-password"
+SEED_START = datetime(2024, 1, 1)
+SEED_SPAN = timedelta(days=730)
+# rows per unit of work; each block has its own random stream, so the data
+# does not depend on how many processes generate it
+BLOCK_SIZE = 10000
+# zipf exponents: a few authors write most posts, a few categories hold most
+# posts, a few posts get most comments
+AUTHOR_SKEW = 1.0
+CATEGORY_SKEW = 1.2
+POST_POPULARITY_SKEW = 0.8
+# comments arrive in a burst after the post, mean delay in hours
+COMMENT_DELAY_HOURS = 12
+WORDS = (
+    "flask python api database index query cache redis worker token search "
+    "post comment category author migration schema session pool latency "
+    "request response json stream batch cursor page filter deploy docker "
+    "postgres sqlite model view route blueprint test metric profile plan "
+    "release feature bug review design cloud server client network memory"
+).split()
+
+USER_COLUMNS = (
+    "id",
+    "username",
+    "email",
+    "password_hash",
+    "role",
+    "created_at",
+    "updated_at",
+)
+POST_COLUMNS = ("id", "author_id", "title", "content", "created_at", "updated_at")
+LINK_COLUMNS = ("post_id", "category_id")
+COMMENT_COLUMNS = ("id", "post_id", "user_id", "content", "created_at", "updated_at")
+
+
+def seed_id(seed, kind, number):
+    # ids are derived from the index, so rows can refer to each other
+    # without keeping every id in memory
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, f"{seed}:{kind}:{number}"))
+
+
+@lru_cache(maxsize=8)
+def _zipf_weights(count, skew):
+    # cumulative, for random.choices(cum_weights=...)
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def _post_time(number, posts):
+    return SEED_START + SEED_SPAN * (number / max(posts, 1))
+
+
+def _popular_post(rank, posts):
+    # spread popularity ranks over the timeline instead of favouring the
+    # oldest posts: a fixed stride coprime with the count is a permutation
+    stride = 7919
+    while math.gcd(stride, posts) != 1:
+        stride += 2
+    return (rank * stride) % posts
+
+
+def _text(rng, low, high):
+    return " ".join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def _user_rows(seed, block, config):
+    start = block * BLOCK_SIZE
+    for n in range(start, min(start + BLOCK_SIZE, config["users"])):
+        yield (
+            seed_id(seed, "user", n),
+            f"user{n}",
+            f"user{n}@example.com",
+            config["password_hash"],
+            UserRole.ADMIN.value if n == 0 else UserRole.AUTHOR.value,
+            SEED_START,
+            SEED_START,
+        )
+
+
+def _post_rows(seed, block, config):
+    rng = random.Random(f"{seed}:posts:{block}")
+    users, posts, categories = config["users"], config["posts"], config["categories"]
+    start = block * BLOCK_SIZE
+    count = min(start + BLOCK_SIZE, posts) - start
+    authors = rng.choices(
+        range(users), cum_weights=_zipf_weights(users, AUTHOR_SKEW), k=count
+    )
+    category_weights = _zipf_weights(categories, CATEGORY_SKEW)
+
+    rows, links = [], []
+    for offset, author in enumerate(authors):
+        n = start + offset
+        post_id = seed_id(seed, "post", n)
+        created_at = _post_time(n, posts)
+        rows.append(
+            (
+                post_id,
+                seed_id(seed, "user", author),
+                _text(rng, 2, 6)[:50],
+                _text(rng, 20, 120),
+                created_at,
+                created_at,
+            )
+        )
+        picked = rng.choices(range(categories), cum_weights=category_weights, k=3)
+        for category in dict.fromkeys(picked[: rng.randint(1, 3)]):
+            links.append((post_id, seed_id(seed, "category", category)))
+    return rows, links
+
+
+def _comment_rows(seed, block, config):
+    rng = random.Random(f"{seed}:comments:{block}")
+    users, posts = config["users"], config["posts"]
+    start = block * BLOCK_SIZE
+    count = min(start + BLOCK_SIZE, config["comments"]) - start
+    ranks = rng.choices(
+        range(posts), cum_weights=_zipf_weights(posts, POST_POPULARITY_SKEW), k=count
+    )
+    commenters = rng.choices(
+        range(users), cum_weights=_zipf_weights(users, AUTHOR_SKEW), k=count
+    )
+    for offset, (rank, commenter) in enumerate(zip(ranks, commenters)):
+        post = _popular_post(rank, posts)
+        created_at = _post_time(post, posts) + timedelta(
+            hours=rng.expovariate(1 / COMMENT_DELAY_HOURS)
+        )
+        yield (
+            seed_id(seed, "comment", start + offset),
+            seed_id(seed, "post", post),
+            seed_id(seed, "user", commenter),
+            _text(rng, 3, 30),
+            created_at,
+            created_at,
+        )
+
+
+def _write(engine, table, columns, rows):
+    rows = list(rows)
+    if not rows:
+        return 0
+    if engine.dialect.name == "postgresql":
+        # COPY is several times faster than even a multi-row INSERT
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+            connection.commit()
+        finally:
+            connection.close()
+    else:
+        with engine.begin() as connection:
+            connection.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+    return len(rows)
+
+
+_engines = {}
+
+
+def _engine(url):
+    # one engine per worker process, reused across its blocks
+    if url not in _engines:
+        _engines[url] = create_engine(url)
+    return _engines[url]
+
+
+def _seed_block(url, kind, seed, block, config):
+    engine = _engine(url) if isinstance(url, str) else url
+    if kind == "users":
+        rows = _user_rows(seed, block, config)
+        return _write(engine, UserModel.__table__, USER_COLUMNS, rows)
+    if kind == "posts":
+        rows, links = _post_rows(seed, block, config)
+        written = _write(engine, PostModel.__table__, POST_COLUMNS, rows)
+        _write(engine, PostCategoryModel.__table__, LINK_COLUMNS, links)
+        return written
+    rows = _comment_rows(seed, block, config)
+    return _write(engine, CommentModel.__table__, COMMENT_COLUMNS, rows)
+
+
+def _run_blocks(kind, total, seed, config, workers, progress):
+    blocks = range(math.ceil(total / BLOCK_SIZE))
+    if workers <= 1:
+        for block in blocks:
+            progress(kind, _seed_block(db.engine, kind, seed, block, config))
+        return
+    url = db.engine.url.render_as_string(hide_password=False)
+    # spawn: workers must not inherit the app's open connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(_seed_block, url, kind, seed, block, config) for block in blocks
+        ]
+        for future in futures:
+            progress(kind, future.result())
+
+
+def seed(
+    posts,
+    users=None,
+    comments=None,
+    categories=None,
+    seed=0,
+    workers=1,
+    progress=lambda kind, rows: None,
+):
+    """Fill an empty database with synthetic content.
+
+    The same arguments always produce the same rows, whatever ``workers``
+    is (only the password salt differs). User 0 is an admin, usernames are
+    ``user<n>`` and every password is ``SEED_PASSWORD``. Rows are written in
+    blocks, by ``workers`` processes with COPY on Postgres and by bulk
+    INSERTs elsewhere; ``progress`` is called after each block.
+    """
+    config = {
+        "posts": posts,
+        "users": users or max(posts // 10, 1),
+        "comments": posts * 2 if comments is None else comments,
+        "categories": categories or max(min(posts // 100, 1000), 10),
+        # hashing once instead of per user keeps seeding fast
+        "password_hash": current_app.password_hasher.hash(SEED_PASSWORD),
+    }
+    if db.engine.dialect.name == "sqlite":
+        # SQLite takes one writer at a time, so extra processes only wait on
+        # its lock (and can't see an in-memory database at all)
+        workers = 1
+
+    _run_blocks("users", config["users"], seed, config, workers, progress)
+    db.session.execute(
+        insert(CategoryModel),
+        [
+            {"id": seed_id(seed, "category", n), "name": f"category-{n}"}
+            for n in range(config["categories"])
+        ],
+    )
+    db.session.commit()
+    _run_blocks("posts", posts, seed, config, workers, progress)
+    _run_blocks("comments", config["comments"], seed, config, workers, progress)
+
+    current_app.search.rebuild_index()
+    db.session.commit()
+    # the rows were written around the ORM hooks that keep the counters
+    for model in COUNTERS:
+        list(reconcile(model))
+    current_app.category_index.bump()
+    return {key: value for key, value in config.items() if key != "password_hash"}
@@ -0,0 +1,136 @@
+from functools import lru_cache
+
+from flask import g, has_request_context
+from marshmallow import fields, missing
+from marshmallow.utils import ensure_text_type
+
+# DateTime formats that marshmallow serializes with datetime.isoformat
+ISO_FORMATS = (None, "iso", "iso8601")
+# off: every schema dumps through marshmallow (used to benchmark the two)
+COMPILED = True
+
+
+@lru_cache(maxsize=64)
+def _sparse_schema(schema_class, only, many):
+    return schema_class(only=only, many=many)
+
+
+class SparseNested(fields.Nested):
+    """Nested schema limited to the request's sparse fieldset (``g.fieldset``)."""
+
+    def sparse_schema(self):
+        only = g.get("fieldset") if has_request_context() else None
+        if not only:
+            return self.schema
+        return _sparse_schema(self.nested, only, self.many)
+
+    def _serialize(self, nested_obj, attr, obj, **kwargs):
+        if nested_obj is None:
+            return None
+        return self.sparse_schema().dump(nested_obj)
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _expression(field, value, namespace):
+    """Source of an expression converting ``value`` the way ``field`` does."""
+    kind = type(field)
+    if kind in (fields.String, fields.Email):
+        return f"({value} if {value}.__class__ is str else text({value}))"
+    if kind is fields.Integer and not field.as_string:
+        return f"int({value})"
+    if kind is fields.DateTime and field.format in ISO_FORMATS:
+        return f"{value}.isoformat()"
+    if kind is fields.List:
+        item = f"{value}_"
+        inner = _expression(field.inner, item, namespace)
+        return f"[None if {item} is None else {inner} for {item} in {value}]"
+    if kind is fields.Nested:
+        dump = compiled_dump(field.schema)
+        if dump is None:
+            raise _Unsupported(field)
+        name = f"dump{len(namespace)}"
+        namespace[name] = dump
+        if field.many or field.schema.many:
+            return f"[{name}({value}_) for {value}_ in {value}]"
+        return f"{name}({value})"
+    if kind is SparseNested:
+        name = f"sparse{len(namespace)}"
+        namespace[name] = field
+        return f"dump_sparse({name}, {value})"
+    raise _Unsupported(field)
+
+
+def _dump_sparse(field, value):
+    schema = field.sparse_schema()
+    dump = compiled_dump(schema) if COMPILED else None
+    if dump is None:
+        return schema.dump(value)
+    return [dump(item) for item in value] if schema.many else dump(value)
+
+
+def _compile(schema):
+    if any(schema._hooks.values()):
+        raise _Unsupported(schema)
+    namespace = {"missing": missing, "text": ensure_text_type}
+    namespace["dump_sparse"] = _dump_sparse
+    lines = [
+        "def dump(obj):",
+        "    get = dict.get if isinstance(obj, dict) else getattr",
+        "    out = {}",
+    ]
+    for name, field in schema.dump_fields.items():
+        if field.dump_default is not missing or not field._CHECK_ATTRIBUTE:
+            raise _Unsupported(field)
+        attribute = field.attribute or name
+        if "." in attribute:
+            raise _Unsupported(field)
+        key = field.data_key if field.data_key is not None else name
+        lines += [
+            f"    value = get(obj, {attribute!r}, missing)",
+            "    if value is not missing:",
+            f"        out[{key!r}] = None if value is None else "
+            + _expression(field, "value", namespace),
+        ]
+    lines.append("    return out")
+    exec("\n".join(lines), namespace)
+    return namespace["dump"]
+
+
+def compiled_dump(schema):
+    """A function dumping one object exactly like ``schema.dump``, or None.
+
+    The function is generated from the schema's fields on first use, so a
+    dump is a run of attribute reads and conversions instead of marshmallow's
+    per-field method calls. Schemas with hooks, custom fields or formats
+    other than the defaults are not compiled.
+    """
+    try:
+        return schema.__dict__["_compiled_dump"]
+    except KeyError:
+        pass
+    try:
+        dump = _compile(schema)
+    except _Unsupported:
+        dump = None
+    schema._compiled_dump = dump
+    return dump
+
+
+class CompiledDumpMixin:
+    """Schema mixin that dumps through ``compiled_dump`` when it can.
+
+    The fields, and so the OpenAPI docs, are the schema's own; only the
+    work done per object changes.
+    """
+
+    def dump(self, obj, *, many=None):
+        dump = compiled_dump(self) if COMPILED else None
+        if dump is None:
+            return super().dump(obj, many=many)
+        many = self.many if many is None else bool(many)
+        if many and obj is not None:
+            return [dump(item) for item in obj]
+        return dump(obj)
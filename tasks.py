@@ -1,30 +1,161 @@
+import logging
 import os
+import random
+import threading
+
+import jinja2
 import requests
 from dotenv import load_dotenv
-import jinja2
+from requests.adapters import HTTPAdapter
+from rq import Retry
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DOMAIN = os.getenv("MAILGUN_DOMAIN")
-template_loader = jinja2.FileSystemLoader("templates")
-template_env = jinja2.Environment(loader=template_loader)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", "/tmp/jinja2-cache")
+
+_template_env = None
+_email_templates = {}
+_template_lock = threading.Lock()
+
+
+def get_template_env():
+    # built at the first render rather than at import, so the web workers,
+    # which import this module but never render, skip it. templates never
+    # change while a worker runs: skip the mtime check on every render, keep
+    # compiled bytecode on disk for the next worker process and the email
+    # templates compiled for every later job
+    global _template_env
+    with _template_lock:
+        if _template_env is None:
+            os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+            env = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+                bytecode_cache=jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+                auto_reload=False,
+            )
+            _email_templates.update(
+                (name, env.get_template(name))
+                for name in env.list_templates(
+                    filter_func=lambda n: n.startswith("email/")
+                )
+            )
+            _template_env = env
+        return _template_env
 
 
 def render_template(template_filename, **context):
-    return template_env.get_template(template_filename).render(**context)
+    env = get_template_env()
+    template = _email_templates.get(template_filename)
+    if template is None:
+        template = env.get_template(template_filename)
+    return template.render(**context)
+
+
+class MailgunTransport:
+    """Mailgun's messages API over one keep-alive session.
+
+    ``base_url`` can point at a local stand-in server to measure throughput
+    without sending real email.
+    """
+
+    def __init__(
+        self,
+        domain,
+        api_key,
+        base_url="https://api.mailgun.net/v3",
+        timeout=(3.05, 10),
+        pool_size=10,
+    ):
+        self.url = f"{base_url.rstrip('/')}/{domain}/messages"
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = ("api", api_key)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def send(self, data):
+        response = self.session.post(self.url, data=data, timeout=self.timeout)
+        # an exception fails the job, so RQ retries it
+        response.raise_for_status()
+        return response.json().get("id")
+
+
+class ConsoleTransport:
+    """Logs messages instead of sending them, for development without Mailgun."""
+
+    def send(self, data):
+        logger.info("Email to %s: %s", data["to"], data["subject"])
+        return None
+
+
+def _timeout():
+    connect, _, read = os.getenv("MAIL_TIMEOUT", "3.05,10").partition(",")
+    return (float(connect), float(read or connect))
+
+
+def make_transport(name):
+    if name == "mailgun":
+        return MailgunTransport(
+            DOMAIN,
+            os.getenv("MAILGUN_API_KEY"),
+            base_url=os.getenv("MAILGUN_API_URL", "https://api.mailgun.net/v3"),
+            timeout=_timeout(),
+        )
+    if name == "console":
+        return ConsoleTransport()
+    raise RuntimeError(f"Unknown mail transport: {name}.")
+
+
+_transport = None
+_transport_pid = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    # one per process: sessions must not be shared across a fork
+    global _transport, _transport_pid
+    with _transport_lock:
+        if _transport is None or _transport_pid != os.getpid():
+            _transport = make_transport(os.getenv("MAIL_TRANSPORT", "mailgun"))
+            _transport_pid = os.getpid()
+        return _transport
+
+
+def set_transport(transport):
+    global _transport, _transport_pid
+    with _transport_lock:
+        _transport, _transport_pid = transport, os.getpid()
+
+
+def email_retry(max_retries=5, base=10, cap=600):
+    """Exponential backoff with jitter for ``queue.enqueue(..., retry=...)``.
+
+    Delays are drawn when the job is enqueued, so jobs that failed together
+    come back spread out instead of all at once. Retries with a delay need a
+    worker started with ``--with-scheduler``.
+    """
+    intervals = []
+    for attempt in range(max_retries):
+        delay = min(cap, base * 2**attempt)
+        intervals.append(int(delay / 2 + random.uniform(0, delay / 2)))
+    return Retry(max=max_retries, interval=intervals)
 
 
 def send_simple_message(to, subject, body, html):
-    return requests.post(
-        f"https://api.mailgun.net/v3/{DOMAIN}/messages",
-        auth=("api", os.getenv("MAILGUN_API_KEY")),
-        data={
+    return get_transport().send(
+        {
             "from": f"TechBlog Team <mailgun@{DOMAIN}>",
             "to": [to],
             "subject": subject,
             "text": body,
             "html": html,
-        },
+        }
     )
 
 